@@ -0,0 +1,63 @@
+""" DbConfigParser reading a SQLite table with 100k keys, in full and incrementally. """
+import atexit
+import shutil
+import sqlite3
+import tempfile
+from pathlib import Path
+
+try:
+    from . import common
+except ImportError:
+    import common
+import zirconium
+
+
+def _create_database(directory: Path, rows: int) -> str:
+    db_file = directory / "config.db"
+    conn = sqlite3.connect(db_file)
+    conn.execute("CREATE TABLE config(key VARCHAR(1024) UNIQUE, value VARCHAR(1024), version INTEGER)")
+    # Other tables are not reflected, but make the database look like a real one
+    for i in range(50):
+        conn.execute(f"CREATE TABLE other{i}(id INTEGER PRIMARY KEY, name VARCHAR(100), created TIMESTAMP)")
+    conn.executemany(
+        "INSERT INTO config VALUES (?, ?, ?)",
+        ((f"section{i % 100}.key{i}", f"value {i}", i) for i in range(rows))
+    )
+    conn.commit()
+    conn.close()
+    return f"sqlite:///{db_file}/config/key/value"
+
+
+def _updater(path: str, parser, changes: int):
+    db_file = path[len("sqlite:///"):path.rfind("/config/key/value")]
+    version = [1000000]
+
+    def _update_and_read():
+        conn = sqlite3.connect(db_file)
+        for i in range(changes):
+            version[0] += 1
+            conn.execute("UPDATE config SET value = ?, version = ? WHERE key = ?", (
+                f"changed {version[0]}", version[0], f"section{i % 100}.key{i}"
+            ))
+        conn.commit()
+        conn.close()
+        parser.read_dict(path, "utf-8")
+    return _update_and_read
+
+
+def cases():
+    directory = Path(tempfile.mkdtemp())
+    atexit.register(shutil.rmtree, directory, True)
+    path = _create_database(directory, 100000)
+    versioned = zirconium.DbConfigParser(version_column="version")
+    versioned.read_dict(path, "utf-8")
+    return {
+        "db.100k.full": lambda: zirconium.DbConfigParser().read_dict(path, "utf-8"),
+        "db.100k.change_token": lambda: versioned.change_token(path, "utf-8"),
+        "db.100k.incremental_unchanged": lambda: versioned.read_dict(path, "utf-8"),
+        "db.100k.incremental_100_changes": _updater(path, versioned, 100),
+    }
+
+
+if __name__ == "__main__":
+    common.run_cases(cases(), repeat=3)
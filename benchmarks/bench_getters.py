@@ -0,0 +1,67 @@
+""" Typed getters with and without the coerced value cache. """
+try:
+    from . import common
+except ImportError:
+    import common
+import zirconium
+
+
+VALUES = {
+    "port": "5432",
+    "ratio": "0.75",
+    "price": "19.99",
+    "name": "application",
+    "enabled": "yes",
+    "timeout": "30s",
+    "pool_size": "16M",
+    "started": "2023-05-05T17:05:05",
+    "data_dir": "/var/lib/application",
+    "hosts": ["one", "two", "three"],
+    "options": {"a": 1, "b": 2},
+}
+
+# Every as_*() method, with the value it reads
+GETTERS = {
+    "as_int": "port",
+    "as_float": "ratio",
+    "as_decimal": "price",
+    "as_str": "name",
+    "as_bool": "enabled",
+    "as_bytes": "pool_size",
+    "as_timedelta": "timeout",
+    "as_date": "started",
+    "as_datetime": "started",
+    "as_path": "data_dir",
+    "as_list": "hosts",
+    "as_set": "hosts",
+    "as_dict": "options",
+}
+
+
+def _build_config(cache_size: int) -> zirconium.ApplicationConfig:
+    cfg = zirconium.ApplicationConfig(True)
+    cfg.set_defaults({"app": {"database": dict(VALUES)}})
+    cfg.init()
+    cfg.set_cache_size(cache_size)
+    return cfg
+
+
+def cases():
+    results = {}
+    for label, size in (("cached", 1024), ("uncached", 0)):
+        cfg = _build_config(size)
+        for method, name in GETTERS.items():
+            getter = getattr(cfg, method)
+            results[f"getters.{label}.{method}"] = lambda g=getter, k=("app", "database", name): g(k)
+    # Cost of counting reads, on the cheapest reads there are
+    for sample_every in (1, 16):
+        cfg = _build_config(1024)
+        cfg.enable_access_stats(sample_every=sample_every)
+        key = ("app", "database", "port")
+        results[f"getters.access_stats_{sample_every}.as_int"] = lambda c=cfg, k=key: c.as_int(k)
+        results[f"getters.access_stats_{sample_every}.get"] = lambda c=cfg, k=key: c.get(k)
+    return results
+
+
+if __name__ == "__main__":
+    common.run_cases(cases())
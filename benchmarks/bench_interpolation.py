@@ -0,0 +1,80 @@
+""" Compares the compiled ${VAR} templates against the original character-by-character state machine. """
+import os
+
+try:
+    from . import common
+except ImportError:
+    import common
+import zirconium
+
+
+def _state_machine(cfg, value: str) -> str:
+    """ The resolver used before templates were compiled, kept here as the point of comparison """
+    state = "buffering"
+    ref_buffer = ""
+    resolved = ""
+    for i in range(0, len(value)):
+        c = value[i]
+        if c == "$":
+            if state == "buffering":
+                state = "opening_ref"
+                continue
+            elif state == "opening_ref":
+                resolved += "$"
+                state = "buffering"
+                continue
+        elif c == "{":
+            if state == "opening_ref":
+                state = "in_ref"
+                continue
+        elif c == "\\":
+            if state == "in_ref":
+                state = "escaping_in_ref"
+                continue
+            elif state == "escaping_in_ref":
+                ref_buffer += "\\"
+                state = "in_ref"
+                continue
+        elif c == "}":
+            if state == "escaping_in_ref":
+                ref_buffer += "}"
+                state = "in_ref"
+                continue
+            elif state == "in_ref":
+                resolved += cfg.parse_env_reference(ref_buffer, "")
+                ref_buffer = ""
+                state = "buffering"
+                continue
+        if state == "buffering":
+            resolved += c
+        elif state == "in_ref":
+            ref_buffer += c
+        elif state == "escaping_in_ref":
+            ref_buffer += "\\" + c
+            state = "in_ref"
+    if ref_buffer:
+        resolved += "${" + ref_buffer
+    return resolved
+
+
+VALUES = {
+    "plain": "postgresql://localhost:5432/application_database",
+    "one_ref": "postgresql://${BENCH_DB_USER}@localhost:5432/application_database",
+    "many_refs": " ".join("${BENCH_DB_USER} $${escaped}" for _ in range(20)),
+    "long_plain": "x" * 4096,
+    "long_many_refs": "".join(f"segment {i} ${{BENCH_DB_USER}} " for i in range(200)),
+}
+
+
+def cases():
+    os.environ["BENCH_DB_USER"] = "bench"
+    cfg = zirconium.ApplicationConfig(True)
+    results = {}
+    for name, value in VALUES.items():
+        results[f"interpolation.template.{name}"] = lambda v=value: cfg.resolve_environment_references(v)
+        results[f"interpolation.state_machine.{name}"] = lambda v=value: _state_machine(cfg, v)
+    return results
+
+
+if __name__ == "__main__":
+    common.run_cases(cases())
@@ -0,0 +1,51 @@
+""" JsonConfigParser with the fastest installed JSON library and with the standard library, on small to huge files. """
+import atexit
+import json
+import shutil
+import tempfile
+from pathlib import Path
+
+try:
+    from . import common
+except ImportError:
+    import common
+import zirconium
+
+
+SIZES = {
+    "small": 10,
+    "medium": 10000,
+    "huge": 250000,
+}
+
+
+def _write_file(directory: Path, name: str, entries: int) -> Path:
+    data = {}
+    for i in range(entries):
+        section = data.setdefault(f"section{i // 100}", {})
+        section[f"key{i}"] = {"value": i, "ratio": i / 7, "name": f"entry {i}", "enabled": i % 2 == 0}
+    path = directory / f"{name}.json"
+    path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+    return path
+
+
+def _reader(path: Path, backend):
+    parser = zirconium.JsonConfigParser()
+    parser.backend = backend
+    return lambda: parser.read_dict(path, "utf-8")
+
+
+def cases():
+    directory = Path(tempfile.mkdtemp())
+    atexit.register(shutil.rmtree, directory, True)
+    results = {}
+    for name, entries in SIZES.items():
+        path = _write_file(directory, name, entries)
+        size = path.stat().st_size // 1024
+        results[f"json.{name}_{size}kib.default"] = _reader(path, None)
+        results[f"json.{name}_{size}kib.stdlib"] = _reader(path, "json")
+    return results
+
+
+if __name__ == "__main__":
+    common.run_cases(cases(), repeat=3)
@@ -0,0 +1,96 @@
+""" init() with many large files, loaded one after another or concurrently, and with 1 to 100 small files per format. """
+import atexit
+import json
+import shutil
+import tempfile
+from pathlib import Path
+
+try:
+    from . import common
+except ImportError:
+    import common
+import zirconium
+
+
+FORMATS = ("json", "yaml", "toml", "ini", "cfg")
+FILE_COUNTS = (1, 10, 100)
+
+
+def _write_files(directory: Path, count: int, entries: int) -> list:
+    files = []
+    for i in range(count):
+        data = {f"section{i}": {f"key{j}": {"value": j, "name": f"entry {j}"} for j in range(entries)}}
+        path = directory / f"config{i}.yaml"
+        # JSON is a subset of YAML, and much faster to generate
+        path.write_text(json.dumps(data, indent=2))
+        files.append(path)
+    return files
+
+
+def _small_file(fmt: str, i: int) -> str:
+    entries = {f"key{j}": f"value {j}" for j in range(20)}
+    if fmt == "json":
+        return json.dumps({f"section{i}": entries}, indent=2)
+    if fmt == "yaml":
+        return f"section{i}:\n" + "".join(f"  {k}: {v}\n" for k, v in entries.items())
+    if fmt == "toml":
+        return f"[section{i}]\n" + "".join(f'{k} = "{v}"\n' for k, v in entries.items())
+    # .ini and .cfg files
+    return f"[section{i}]\n" + "".join(f"{k} = {v}\n" for k, v in entries.items())
+
+
+def _write_small_files(directory: Path, fmt: str, count: int) -> list:
+    files = []
+    for i in range(count):
+        path = directory / f"small{i}.{fmt}"
+        path.write_text(_small_file(fmt, i))
+        files.append(path)
+    return files
+
+
+def _loader(files, parallel, use_processes=False, cache_dir=None, load_stats=False):
+    def _load():
+        cfg = zirconium.ApplicationConfig(True)
+        cfg.enable_load_stats(load_stats)
+        if cache_dir is not None:
+            cfg.enable_parse_cache(cache_dir)
+        if parallel:
+            cfg.set_parallel_loading(use_processes=use_processes)
+        for file in files:
+            cfg.register_file(file)
+        cfg.init()
+    return _load
+
+
+def _reloaded_config(files):
+    cfg = zirconium.ApplicationConfig(True)
+    for file in files:
+        cfg.register_file(file)
+    cfg.init()
+    return cfg
+
+
+def cases():
+    directory = Path(tempfile.mkdtemp())
+    atexit.register(shutil.rmtree, directory, True)
+    files = _write_files(directory, 12, 500)
+    results = {}
+    for fmt in FORMATS:
+        for count in FILE_COUNTS:
+            subdirectory = directory / f"{fmt}{count}"
+            subdirectory.mkdir()
+            results[f"loading.{fmt}.files{count}"] = _loader(_write_small_files(subdirectory, fmt, count), False)
+    results["loading.json.files100.load_stats"] = _loader(sorted((directory / "json100").iterdir()), False, load_stats=True)
+    results.update({
+        "loading.yaml12.sequential": _loader(files, False),
+        "loading.yaml12.threads": _loader(files, True),
+        "loading.yaml12.processes": _loader(files, True, True),
+        "loading.yaml12.parse_cache": _loader(files, False, cache_dir=directory / "cache"),
+        "loading.yaml12.reload_unchanged": _reloaded_config(files).reload_config,
+        "loading.yaml12.reload_full": lambda cfg=_reloaded_config(files): cfg.reload_config(full=True),
+    })
+    return results
+
+
+if __name__ == "__main__":
+    common.run_cases(cases(), repeat=3)
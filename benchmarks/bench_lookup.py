@@ -0,0 +1,44 @@
+""" Deep lookups through tree navigation versus the flat path index. """
+try:
+    from . import common
+except ImportError:
+    import common
+import zirconium
+from zirconium.sharedmem import SharedMapping, encode_tree
+from zirconium.utils import MutableDeepDict
+
+
+def _build_tree(depth: int, width: int) -> dict:
+    root = {}
+    node = root
+    for level in range(depth):
+        for i in range(width):
+            node[f"sibling{i}"] = i
+        node[f"level{level}"] = {}
+        node = node[f"level{level}"]
+    node["leaf"] = "value"
+    return root
+
+
+def cases():
+    results = {}
+    for depth in (1, 4, 16):
+        key = tuple(f"level{level}" for level in range(depth)) + ("leaf",)
+        for label, indexed in (("navigate", False), ("index", True)):
+            mdd = MutableDeepDict(_build_tree(depth, 20), indexed=indexed)
+            results[f"lookup.{label}.depth{depth}"] = lambda m=mdd, k=key: m.get(k)
+        data = encode_tree(_build_tree(depth, 20))
+        shared = MutableDeepDict(SharedMapping(memoryview(data), int.from_bytes(data[4:12], "little")))
+        results[f"lookup.shared_memory.depth{depth}"] = lambda m=shared, k=key: m.get(k)
+    for depth in (1, 2, 4, 8, 16):
+        cfg = zirconium.ApplicationConfig(True)
+        cfg.load_from_dict(_build_tree(depth, 20))
+        key = tuple(f"level{level}" for level in range(depth)) + ("leaf",)
+        results[f"lookup.config_get.depth{depth}"] = lambda c=cfg, k=key: c.get(k)
+    indexed = MutableDeepDict(_build_tree(4, 50), indexed=True)
+    results["lookup.find.depth4"] = lambda m=indexed: m.find("level0.level1.*")
+    return results
+
+
+if __name__ == "__main__":
+    common.run_cases(cases())
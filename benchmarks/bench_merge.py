@@ -0,0 +1,55 @@
+""" MutableDeepDict.deep_update() on wide, deep and list-heavy trees. """
+try:
+    from . import common
+except ImportError:
+    import common
+from zirconium.utils import MutableDeepDict
+
+
+def _wide_tree(sections: int, keys: int, value: str) -> dict:
+    return {f"section{i}": {f"key{j}": f"{value} {j}" for j in range(keys)} for i in range(sections)}
+
+
+def _deep_tree(depth: int, value: str) -> dict:
+    tree = {"leaf": value}
+    for level in reversed(range(depth)):
+        tree = {f"level{level}": tree, f"sibling{level}": value}
+    return tree
+
+
+def _list_tree(sections: int, items: int) -> dict:
+    return {f"section{i}": {"items": list(range(items))} for i in range(sections)}
+
+
+TREES = {
+    "wide_10x1000": lambda value: _wide_tree(10, 1000, value),
+    "wide_1000x10": lambda value: _wide_tree(1000, 10, value),
+    "deep_100": lambda value: _deep_tree(100, value),
+    "lists_10x10000": lambda value: _list_tree(10, 10000),
+}
+
+
+def _merge_into_empty(tree, indexed):
+    return lambda: MutableDeepDict(indexed=indexed).deep_update(tree)
+
+
+def _merge_overlay(base, overlay, indexed):
+    # Merging the same overlay again walks and replaces every key, just like the first time
+    target = MutableDeepDict(indexed=indexed)
+    target.deep_update(base)
+    return lambda: target.deep_update(overlay)
+
+
+def cases():
+    results = {}
+    for name, build in TREES.items():
+        base = build("base")
+        overlay = build("overlay")
+        for label, indexed in (("plain", False), ("indexed", True)):
+            results[f"merge.{name}.{label}.into_empty"] = _merge_into_empty(base, indexed)
+            results[f"merge.{name}.{label}.overlay"] = _merge_overlay(base, overlay, indexed)
+    return results
+
+
+if __name__ == "__main__":
+    common.run_cases(cases(), repeat=3)
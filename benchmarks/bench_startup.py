@@ -0,0 +1,33 @@
+""" Cost of importing zirconium and constructing ApplicationConfig, which every worker pays at boot. """
+import subprocess
+import sys
+
+try:
+    from . import common
+except ImportError:
+    import common
+import zirconium
+
+
+def _import_in_subprocess():
+    subprocess.run(
+        [sys.executable, "-c", "import zirconium"],
+        check=True,
+        env={"PYTHONPATH": str(common.SOURCE_PATH)},
+    )
+
+
+def _python_in_subprocess():
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+
+
+def cases():
+    return {
+        "startup.python_baseline": _python_in_subprocess,
+        "startup.import_zirconium": _import_in_subprocess,
+        "startup.construct_manual": lambda: zirconium.ApplicationConfig(True),
+    }
+
+
+if __name__ == "__main__":
+    common.run_cases(cases(), repeat=3)
@@ -0,0 +1,53 @@
+""" YamlConfigParser with the libyaml loader and the pure-Python loader. """
+import atexit
+import shutil
+import tempfile
+from pathlib import Path
+
+try:
+    from . import common
+except ImportError:
+    import common
+import zirconium
+
+
+SIZES = {
+    "small": 10,
+    "large": 20000,
+}
+
+
+def _write_file(directory: Path, name: str, entries: int) -> Path:
+    lines = []
+    for i in range(entries):
+        if i % 100 == 0:
+            lines.append(f"section{i // 100}:")
+        lines.append(f"  key{i}:")
+        lines.append(f"    value: {i}")
+        lines.append(f"    name: entry {i}")
+        lines.append(f"    enabled: {'true' if i % 2 == 0 else 'false'}")
+    path = directory / f"{name}.yaml"
+    path.write_text("\n".join(lines), encoding="utf-8")
+    return path
+
+
+def _reader(path: Path, use_libyaml: bool):
+    parser = zirconium.YamlConfigParser()
+    parser.use_libyaml = use_libyaml
+    return lambda: parser.read_dict(path, "utf-8")
+
+
+def cases():
+    directory = Path(tempfile.mkdtemp())
+    atexit.register(shutil.rmtree, directory, True)
+    results = {}
+    for name, entries in SIZES.items():
+        path = _write_file(directory, name, entries)
+        size = path.stat().st_size // 1024
+        results[f"yaml.{name}_{size}kib.libyaml"] = _reader(path, True)
+        results[f"yaml.{name}_{size}kib.python"] = _reader(path, False)
+    return results
+
+
+if __name__ == "__main__":
+    common.run_cases(cases(), repeat=3)
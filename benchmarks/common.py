@@ -0,0 +1,26 @@
+import sys
+import timeit
+import typing as t
+from pathlib import Path
+
+# Allow running the benchmarks from a source checkout without installing the package
+SOURCE_PATH = Path(__file__).parent.parent / "src"
+if str(SOURCE_PATH) not in sys.path:
+    sys.path.insert(0, str(SOURCE_PATH))
+
+
+def measure(fn: t.Callable, number: t.Optional[int] = None, repeat: int = 5) -> float:
+    """ Time fn and return the best per-call time in seconds """
+    timer = timeit.Timer(fn)
+    if number is None:
+        number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def run_cases(cases: t.Dict[str, t.Callable], repeat: int = 5) -> t.Dict[str, float]:
+    """ Time each case and print a short report """
+    results = {}
+    for name, fn in cases.items():
+        results[name] = measure(fn, repeat=repeat)
+        print(f"{name:<50} {results[name] * 1e6:12.3f} us")
+    return results
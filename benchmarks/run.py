@@ -0,0 +1,116 @@
+""" Run the benchmark suite and compare the results with the stored baselines.
+
+    python benchmarks/run.py                        # run every benchmark and report regressions
+    python benchmarks/run.py -k getters -k merge    # only the cases whose name contains one of the patterns
+    python benchmarks/run.py --save                 # store the results as the new baselines
+
+    Exits with status 1 if any case is slower than its baseline by more than the threshold (20% by default).
+    Baselines are only comparable on the machine and Python version they were recorded with, so save new ones before
+    comparing on another machine.
+"""
+import argparse
+import importlib
+import json
+import platform
+import sys
+import typing as t
+from pathlib import Path
+
+try:
+    from . import common
+except ImportError:
+    import common
+
+
+BENCHMARK_DIR = Path(__file__).parent
+BASELINE_FILE = BENCHMARK_DIR / "baselines.json"
+DEFAULT_THRESHOLD = 0.2
+
+
+def environment() -> dict:
+    return {
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "system": platform.system(),
+        "python": platform.python_version(),
+    }
+
+
+def load_cases(patterns: t.Iterable[str] = ()) -> t.Dict[str, t.Callable]:
+    """ Collect the cases of every bench_*.py module, keeping those which match one of the patterns """
+    patterns = list(patterns)
+    cases = {}
+    for path in sorted(BENCHMARK_DIR.glob("bench_*.py")):
+        module = importlib.import_module(f"{__package__}.{path.stem}" if __package__ else path.stem)
+        for name, fn in module.cases().items():
+            if not patterns or any(pattern in name for pattern in patterns):
+                cases[name] = fn
+    return cases
+
+
+def load_baselines(path: Path = BASELINE_FILE) -> dict:
+    if not path.exists():
+        return {"environment": {}, "results": {}}
+    with open(path, "r", encoding="utf-8") as h:
+        return json.load(h)
+
+
+def save_baselines(results: t.Dict[str, float], path: Path = BASELINE_FILE):
+    """ Store the results, keeping the baselines of cases that were not run """
+    baselines = load_baselines(path)
+    if baselines["environment"] != environment():
+        baselines["results"] = {}
+    baselines["environment"] = environment()
+    baselines["results"].update(results)
+    baselines["results"] = dict(sorted(baselines["results"].items()))
+    with open(path, "w", encoding="utf-8") as h:
+        json.dump(baselines, h, indent=2)
+        h.write("\n")
+
+
+def compare(results: t.Dict[str, float], baselines: t.Dict[str, float], threshold: float) -> t.List[str]:
+    """ Print each result next to its baseline and return the names of the cases that regressed """
+    regressions = []
+    print()
+    print(f"{'case':<50} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, current in results.items():
+        baseline = baselines.get(name)
+        if baseline is None:
+            print(f"{name:<50} {'-':>12} {current * 1e6:10.3f}us {'new':>8}")
+            continue
+        change = (current - baseline) / baseline
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change < -threshold:
+            flag = "  improved"
+        print(f"{name:<50} {baseline * 1e6:10.3f}us {current * 1e6:10.3f}us {change:+8.1%}{flag}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run the zirconium benchmarks and compare them with the baselines")
+    parser.add_argument("-k", dest="patterns", action="append", default=[], help="only run cases containing this")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="slowdown reported as a regression")
+    parser.add_argument("--repeat", type=int, default=3, help="number of timings to take the best of")
+    parser.add_argument("--save", action="store_true", help="store the results as the new baselines")
+    parser.add_argument("--baselines", type=Path, default=BASELINE_FILE, help="baseline file to use")
+    args = parser.parse_args(argv)
+    results = common.run_cases(load_cases(args.patterns), repeat=args.repeat)
+    if args.save:
+        save_baselines(results, args.baselines)
+        print(f"\nSaved {len(results)} baselines to {args.baselines}")
+        return 0
+    baselines = load_baselines(args.baselines)
+    if baselines["environment"] and baselines["environment"] != environment():
+        print(f"\nWarning: baselines were recorded on {baselines['environment']}, not {environment()}")
+    regressions = compare(results, baselines["results"], args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} case(s) more than {args.threshold:.0%} slower than their baseline")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
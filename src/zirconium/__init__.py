@@ -1,6 +1,7 @@
 from .config import ApplicationConfig, test_with_config
 from .parsers import JsonConfigParser, IniConfigParser, YamlConfigParser, TomlConfigParser, CfgConfigParser, DbConfigParser
+from .stats import LoadStats, LoadPhase, AccessStats
 from .utils import _config_decorator as configure
-from .utils import print_config, convert_to_bytes, convert_to_timedelta
+from .utils import print_config, convert_to_bytes, convert_to_timedelta, coerce_bytes, coerce_timedelta
 
 __version__ = "1.2.4"
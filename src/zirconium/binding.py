@@ -0,0 +1,193 @@
+import collections.abc
+import dataclasses
+import datetime
+import decimal
+import functools
+import sys
+import typing as t
+from pathlib import Path
+
+from .utils import coerce_timedelta, coerce_date, coerce_datetime, copy_tree, _MISSING
+
+# Annotated[] and the functions to take it apart were added in Python 3.9
+if sys.version_info >= (3, 9):
+    from typing import Annotated, get_args, get_origin, get_type_hints
+else:
+    try:
+        from typing_extensions import Annotated, get_args, get_origin, get_type_hints
+    except ImportError:
+        Annotated = None
+
+        def get_origin(tp):
+            return getattr(tp, "__origin__", None)
+
+        def get_args(tp):
+            return getattr(tp, "__args__", ())
+
+        def get_type_hints(obj, include_extras=False):
+            return t.get_type_hints(obj)
+
+T = t.TypeVar("T")
+
+
+def _blank_to_none(coerce):
+    def _coerce(val):
+        return None if val == "" else coerce(val)
+    return _coerce
+
+
+def _identity(val):
+    return val
+
+
+# Same conversions as the matching as_*() methods
+SCALAR_COERCERS = {
+    int: _blank_to_none(int),
+    float: _blank_to_none(float),
+    decimal.Decimal: _blank_to_none(decimal.Decimal),
+    Path: _blank_to_none(Path),
+    datetime.timedelta: _blank_to_none(coerce_timedelta),
+    datetime.datetime: _blank_to_none(coerce_datetime),
+    datetime.date: _blank_to_none(coerce_date),
+    str: str,
+    bool: bool,
+}
+
+CONTAINER_COERCERS = {
+    list: list,
+    set: set,
+    frozenset: frozenset,
+    tuple: tuple,
+    dict: copy_tree,
+}
+
+
+class _Field(t.NamedTuple):
+    name: str
+    key: t.Any
+    interpolate: bool
+    coerce: t.Callable
+    nested: t.Optional["BindingPlan"]
+    default: t.Any
+    default_factory: t.Any
+
+
+def _is_section_class(tp) -> bool:
+    if not isinstance(tp, type) or tp in SCALAR_COERCERS or tp in CONTAINER_COERCERS:
+        return False
+    return dataclasses.is_dataclass(tp) or bool(getattr(tp, "__annotations__", None))
+
+
+def _coercer_for(tp) -> t.Tuple[bool, t.Callable, t.Optional["BindingPlan"]]:
+    """ Find how to convert a value for a field annotated with tp, as (interpolate, coerce, nested plan) """
+    origin = get_origin(tp)
+    if Annotated is not None and origin is Annotated:
+        base, *metadata = get_args(tp)
+        custom = [m for m in metadata if callable(m)]
+        if custom:
+            return True, _blank_to_none(custom[-1]), None
+        return _coercer_for(base)
+    if origin is t.Union:
+        args = [a for a in get_args(tp) if a is not type(None)]
+        return _coercer_for(args[0]) if len(args) == 1 else (True, _identity, None)
+    if origin in CONTAINER_COERCERS:
+        return False, CONTAINER_COERCERS[origin], None
+    if tp in CONTAINER_COERCERS:
+        return False, CONTAINER_COERCERS[tp], None
+    if tp in SCALAR_COERCERS:
+        return True, SCALAR_COERCERS[tp], None
+    if _is_section_class(tp):
+        return False, _identity, compile_plan(tp)
+    return True, _identity, None
+
+
+class BindingPlan:
+    """ How to build an instance of a class from a section of the configuration, worked out once per class """
+
+    def __init__(self, cls):
+        self.cls = cls
+        hints = get_type_hints(cls, include_extras=True)
+        fields = []
+        if dataclasses.is_dataclass(cls):
+            self._construct = cls
+            for f in dataclasses.fields(cls):
+                if f.init:
+                    key = f.metadata.get("config_key", f.name)
+                    fields.append((f.name, key, hints.get(f.name, t.Any), f.default, f.default_factory))
+        elif issubclass(cls, tuple) and hasattr(cls, "_fields"):
+            self._construct = cls
+            for name in cls._fields:
+                fields.append((name, name, hints.get(name, t.Any), cls._field_defaults.get(name, _MISSING), _MISSING))
+        else:
+            self._construct = self._construct_plain
+            for name, hint in hints.items():
+                if get_origin(hint) is t.ClassVar:
+                    continue
+                fields.append((name, name, hint, getattr(cls, name, _MISSING), _MISSING))
+        self.fields = []
+        for name, key, hint, default, default_factory in fields:
+            if default is dataclasses.MISSING:
+                default = _MISSING
+            if default_factory is dataclasses.MISSING:
+                default_factory = _MISSING
+            interpolate, coerce, nested = _coercer_for(hint)
+            self.fields.append(_Field(name, key, interpolate, coerce, nested, default, default_factory))
+
+    def _construct_plain(self, **values):
+        obj = self.cls.__new__(self.cls)
+        for name, value in values.items():
+            object.__setattr__(obj, name, value)
+        return obj
+
+    def build(self, section, resolve: t.Callable[[str], str], path: tuple = ()):
+        """ Build an instance from section, using resolve() to replace environment variable references """
+        if section is None:
+            section = {}
+        elif not isinstance(section, collections.abc.Mapping):
+            raise ValueError(f"Configuration value for {'.'.join(str(k) for k in path)} must be a section")
+        values = {}
+        for f in self.fields:
+            val = section.get(f.key, _MISSING)
+            if val is _MISSING:
+                if f.nested is not None and f.default is _MISSING and f.default_factory is _MISSING:
+                    val = None
+                elif f.default is not _MISSING:
+                    values[f.name] = f.default
+                    continue
+                elif f.default_factory is not _MISSING:
+                    values[f.name] = f.default_factory()
+                    continue
+                else:
+                    raise ValueError(f"Missing configuration value for {'.'.join(str(k) for k in path + (f.key,))}")
+            if f.nested is not None:
+                values[f.name] = f.nested.build(val, resolve, path + (f.key,))
+            elif val is None:
+                values[f.name] = None
+            else:
+                if f.interpolate and isinstance(val, str):
+                    val = resolve(val)
+                values[f.name] = f.coerce(val)
+        return self._construct(**values)
+
+
+@functools.lru_cache(maxsize=None)
+def compile_plan(cls) -> BindingPlan:
+    return BindingPlan(cls)
+
+
+class ConfigBinding(t.Generic[T]):
+    """ An instance of a class built from a section of the configuration, rebuilt when the configuration is loaded """
+
+    __slots__ = ("key", "plan", "value", "__weakref__")
+
+    def __init__(self, key: tuple, cls: t.Type[T]):
+        self.key = key
+        self.plan = compile_plan(cls)
+        self.value: t.Optional[T] = None
+
+    def rebuild(self, root: dict, resolve: t.Callable[[str], str]):
+        section = root
+        for k in self.key:
+            section = section.get(k) if isinstance(section, collections.abc.Mapping) else None
+        # Replaced in one step, readers see either the previous instance or the new one
+        self.value = self.plan.build(section, resolve, self.key)
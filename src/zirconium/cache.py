@@ -0,0 +1,145 @@
+import hashlib
+import logging
+import os
+import pickle
+import typing as t
+from pathlib import Path
+
+
+# Bump when the layout of the entries changes so that old entries are ignored
+CACHE_FORMAT = 1
+
+
+def _is_private(st: os.stat_result) -> bool:
+    """ Check that a file or directory is owned by the current user and cannot be written by others """
+    if not hasattr(os, "getuid"):
+        # Permissions are not Unix-style
+        return True
+    return st.st_uid == os.getuid() and not st.st_mode & 0o022
+
+
+class ParseCache:
+    """ On-disk cache of parsed configuration files.
+
+        Entries are validated against the path, modification time and size of the file (and optionally a hash of its
+        content) before they are used. Entries are written to a temporary file and moved into place, so many processes
+        can share the same cache directory. When the directory grows beyond max_size bytes, the least recently used
+        entries are removed.
+
+        Since entries are unpickled, the directory is created private to the current user, and neither a directory nor
+        an entry that is owned by another user or writable by others is used.
+    """
+
+    def __init__(self, cache_dir: t.Union[str, Path], max_size: int = 67108864, verify_hash: bool = False):
+        self.cache_dir = Path(cache_dir).expanduser().absolute()
+        self.max_size = max_size
+        self.verify_hash = verify_hash
+        self.log = logging.getLogger("zirconium")
+        self.cache_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        self.enabled = _is_private(self.cache_dir.stat())
+        if not self.enabled:
+            self.log.warning(f"Not using cache directory {self.cache_dir}, it is writable by other users")
+
+    def _entry_path(self, file_path: Path, parser, encoding: str) -> Path:
+        parser_name = f"{type(parser).__module__}.{type(parser).__qualname__}"
+        key = hashlib.sha256(f"{file_path}|{parser_name}|{encoding}".encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{key}.zcache"
+
+    def file_stamp(self, file_path: Path) -> tuple:
+        """ Build the values used to check that an entry is still valid for file_path """
+        st = os.stat(file_path)
+        content_hash = None
+        if self.verify_hash:
+            h = hashlib.blake2b()
+            with open(file_path, "rb") as fh:
+                for chunk in iter(lambda: fh.read(1048576), b""):
+                    h.update(chunk)
+            content_hash = h.hexdigest()
+        return CACHE_FORMAT, str(file_path), st.st_mtime_ns, st.st_size, content_hash
+
+    def lookup(self, file_path: Path, parser, encoding: str) -> t.Tuple[t.Optional[dict], tuple]:
+        """ Find the parsed content of a file.
+
+            :returns: A tuple of the parsed content (None if there is no valid entry) and the stamp to pass to store()
+        """
+        stamp = self.file_stamp(file_path)
+        if not self.enabled:
+            return None, stamp
+        entry = self._entry_path(file_path, parser, encoding)
+        try:
+            with open(entry, "rb") as h:
+                if not _is_private(os.fstat(h.fileno())):
+                    self.log.warning(f"Ignoring cache entry {entry}, it is writable by other users")
+                    return None, stamp
+                if pickle.load(h) != stamp:
+                    return None, stamp
+                data = pickle.load(h)
+        except FileNotFoundError:
+            return None, stamp
+        except Exception as ex:
+            # Entries are only ever written atomically, but don't fail to load configuration because of a bad one
+            self.log.warning(f"Ignoring unreadable cache entry {entry}: {ex}")
+            return None, stamp
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        return data, stamp
+
+    def store(self, file_path: Path, parser, encoding: str, stamp: tuple, data: dict):
+        """ Save the parsed content of a file, as of the given stamp """
+        if not self.enabled:
+            return
+        try:
+            payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as ex:
+            self.log.debug(f"Parsed content of {file_path} cannot be cached: {ex}")
+            return
+        import tempfile
+        entry = self._entry_path(file_path, parser, encoding)
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".tmp", suffix=".zcache")
+        try:
+            with os.fdopen(fd, "wb") as h:
+                pickle.dump(stamp, h, protocol=pickle.HIGHEST_PROTOCOL)
+                h.write(payload)
+            os.replace(temp_path, entry)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+        self.evict()
+
+    def evict(self):
+        """ Remove the least recently used entries until the cache fits in max_size """
+        entries = []
+        total = 0
+        for entry in self.cache_dir.glob("*.zcache"):
+            if entry.name.startswith(".tmp"):
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, entry))
+            total += st.st_size
+        if total <= self.max_size:
+            return
+        entries.sort()
+        for _, size, entry in entries:
+            try:
+                entry.unlink()
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_size:
+                break
+
+    def clear(self):
+        """ Remove every entry """
+        for entry in self.cache_dir.glob("*.zcache"):
+            try:
+                entry.unlink()
+            except OSError:
+                pass
@@ -2,6 +2,13 @@ import os
 import decimal
 import datetime
 import threading
+import functools
+import inspect
+import contextlib
+import contextvars
+import collections
+import weakref
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import sys
 import time
 from pathlib import Path
@@ -11,8 +18,14 @@ import typing as t
 
 
 from autoinject import injector, CacheStrategy
+from .binding import ConfigBinding
+from .cache import ParseCache
+from .stats import LoadStats, AccessStats, file_size
+from .watcher import ConfigWatcher
 from .parsers import JsonConfigParser, IniConfigParser, YamlConfigParser, TomlConfigParser, CfgConfigParser
-from .utils import MutableDeepDict, _AppConfigHooks, convert_to_timedelta, convert_to_bytes, parse_for_units
+from .utils import MutableDeepDict, _AppConfigHooks, compile_env_template, LRUCache, copy_tree, \
+    diff_trees, tree_value, share_subtrees, _is_mapping, copy_index, coerce_bytes, coerce_timedelta, coerce_date, coerce_datetime, _MISSING, \
+    run_awaitable, LoadLock
 
 # Metadata entrypoint support depends on Python version
 import importlib.util
@@ -38,24 +51,158 @@ else:
     from importlib_metadata import entry_points
 
 
+# Built-in parsers by file extension, these are only created when a matching file is loaded
+BUILTIN_PARSERS = {
+    ".toml": TomlConfigParser,
+    ".yaml": YamlConfigParser,
+    ".yml": YamlConfigParser,
+    ".cfg": CfgConfigParser,
+    ".ini": IniConfigParser,
+    ".json": JsonConfigParser,
+}
+
+_entry_point_cache = {}
+_entry_point_lock = threading.Lock()
+
+
+def cached_entry_points(group: str) -> list:
+    """ Find the entry points in group. Results are cached for the interpreter and search path they were found with,
+        since scanning site-packages is slow. """
+    cache_key = (group, sys.executable, sys.prefix, tuple(sys.path))
+    with _entry_point_lock:
+        if cache_key not in _entry_point_cache:
+            _entry_point_cache[cache_key] = list(entry_points(group=group))
+        return _entry_point_cache[cache_key]
+
+
 VT = t.TypeVar("VT")
 
+# Returned instead of a timed phase when load statistics are disabled
+_NOT_TIMED = contextlib.nullcontext()
+
+# Value of secrets that could not be fetched (timed out or unknown provider), which are tried again on the next load
+_NOT_FETCHED = object()
+
+
+def _copied_dict(section) -> MutableDeepDict:
+    return MutableDeepDict(copy_tree(section))
+
+
+def _fetched_values(results: dict) -> dict:
+    return {key: (None if value is _NOT_FETCHED else value) for key, value in results.items()}
+
+
+def _env_fingerprint(names: t.Tuple[str, ...]) -> tuple:
+    """ Cheap snapshot of the environment variables that a value was resolved from """
+    environ = os.environ
+    return tuple((environ.get(n), environ.get(n.lower()), environ.get(n.upper())) for n in names)
+
+
+def _is_coroutine_callable(fn) -> bool:
+    return inspect.iscoroutinefunction(fn) or inspect.iscoroutinefunction(getattr(fn, "__call__", None))
+
+
+def _cached_getter(fn):
+    """ Memoize the coerced result of an as_*() method.
+
+        Entries are tied to the version of the configuration they were computed from, as well as to the environment
+        variables referenced by the value. Calls with unhashable arguments are not cached.
+    """
+    method_name = fn.__name__
+
+    @functools.wraps(fn)
+    def _cached(self, key, *args, **kwargs):
+        if self._access_stats is not None:
+            self._access_stats.record((key,), method_name)
+        # Include the types, since equal values of different types (e.g. defaults of 1 and 1.0) give different results
+        cache_key = (
+            method_name,
+            key,
+            tuple((type(v), v) for v in args),
+            tuple((k, type(v), v) for k, v in kwargs.items())
+        )
+        cache = self._cached_gets
+        try:
+            entry = cache.get(cache_key)
+        except TypeError:
+            return fn(self, key, *args, **kwargs)
+        state = self._pinned.get() or self._live
+        if entry is not None and entry[0] is state[2] and (not entry[2] or entry[3] == _env_fingerprint(entry[2])):
+            cache.hits += 1
+            return entry[1]
+        cache.misses += 1
+        tracking = self._env_tracking
+        previous = getattr(tracking, "names", None)
+        tracking.names = names = []
+        # Compute from the same version that the entry is stored for, even if a reload happens meanwhile
+        pinned = self._pinned.set(state)
+        try:
+            value = fn(self, key, *args, **kwargs)
+        finally:
+            self._pinned.reset(pinned)
+            tracking.names = previous
+        if previous is not None:
+            previous.extend(names)
+        names = tuple(set(names))
+        cache.put(cache_key, (state[2], value, names, _env_fingerprint(names) if names else None))
+        return value
+
+    return _cached
+
+
+def _recorded_getter(fn):
+    """ Count the calls of an as_*() method that is not cached, when access statistics are enabled """
+    method_name = fn.__name__
+
+    @functools.wraps(fn)
+    def _recorded(self, key, *args, **kwargs):
+        if self._access_stats is not None:
+            self._access_stats.record((key,), method_name)
+        return fn(self, key, *args, **kwargs)
+
+    return _recorded
+
+
+# Refs are usually created with the same few sets of arguments, so they share one dictionary for each
+_SHARED_KWARGS = {}
+
+
+def _shared_kwargs(kwargs: dict) -> dict:
+    try:
+        # Include the types, since equal values of different types (e.g. 1 and True) aren't interchangeable
+        key = tuple((k, type(v), v) for k, v in kwargs.items())
+        shared = _SHARED_KWARGS.get(key)
+        if shared is None and len(_SHARED_KWARGS) < 1024:
+            shared = _SHARED_KWARGS.setdefault(key, kwargs)
+        return kwargs if shared is None else shared
+    except TypeError:
+        return kwargs
+
 
 class _ConfigRef(t.Generic[VT]):
 
+    __slots__ = ("config", "cb_method", "key", "kwargs", "_state", "__weakref__")
+
     def __init__(self, cfg_obj, cb_method, key, **kwargs):
         self.config = cfg_obj
         self.cb_method = cb_method
         self.key = key
-        self.kwargs = kwargs
-        self._cached = None
-        self._cache_identifier = None
+        self.kwargs = _shared_kwargs(kwargs)
+        # (cache identifier, value), replaced as a whole so that concurrent refreshes can't mix them up
+        self._state = (None, None)
+        cfg_obj._register_ref(self)
 
     def _ensure_cache(self) -> t.Optional[VT]:
-        if self._cache_identifier is None or self._cache_identifier != self.config.cache_identifier:
-            self._cache_identifier = self.config.cache_identifier
-            self._cached = getattr(self.config, self.cb_method)(self.key, **self.kwargs)
-        return self._cached
+        pinned = self.config._pinned.get()
+        if pinned is not None and pinned is not self.config._live:
+            # Within a snapshot of an older version, which the cached value is not for
+            return getattr(self.config, self.cb_method)(self.key, **self.kwargs)
+        identifier, cached = self._state
+        current = self.config.cache_identifier
+        if identifier is None or identifier != current:
+            cached = getattr(self.config, self.cb_method)(self.key, **self.kwargs)
+            self._state = (current, cached)
+        return cached
 
     def __eq__(self, other) -> bool:
         if isinstance(other, _ConfigRef):
@@ -95,17 +242,22 @@ class ApplicationConfig(MutableDeepDict):
 
     @injector.construct
     def __init__(self, manual_init=False):
-        super().__init__()
+        # The published version of the configuration is (root, index, version token), replaced as a whole on writes
+        self._live = ({}, None, object())
+        self._pinned = contextvars.ContextVar(f"zirconium_snapshot_{id(self)}", default=None)
+        super().__init__(copy_on_write=True)
         self.log = logging.getLogger("zirconium")
         self.encoding = "utf-8"
-        self.parsers = [
-            TomlConfigParser(),
-            YamlConfigParser(),
-            CfgConfigParser(),
-            IniConfigParser(),
-            JsonConfigParser(),
-        ]
+        # Parsers registered with register_parser()
+        self.parsers = []
+        self._builtin_parsers = {}
+        # Parsers registered with register_parser() for file extensions, which are tried before the built-in ones
+        self._suffix_parsers = {}
+        # Parsers from the zirconium.parsers entry point are loaded the first time no built-in parser matches
+        self._entry_point_parsers = [] if manual_init else None
         self._secret_providers = {}
+        self.secret_cache = sp.SecretCache()
+        self._secret_loading = (8, None)
         if sp.AZURE_ENABLED:
             self._secret_providers["azure_key_vault"] = sp.azure_key_vault
         self.file_registry = {
@@ -118,27 +270,144 @@ class ApplicationConfig(MutableDeepDict):
         self.environment_map = {}
         self._default_config = {}
         self._on_load = []
+        self._change_subscribers = []
+        self._bindings = weakref.WeakSet()
+        # Held for the whole of a load, so that init(), ainit() and the reloads exclude each other
+        self._load_lock = LoadLock()
         self.loaded_files = []
         self._init_flag = False
         self.cache_identifier = None
-        self._cached_gets = {}
+        self._tree_version = 0
+        self._cached_gets = LRUCache(1024)
+        self._use_path_index = False
+        self._parallel_loading = None
+        self._parse_cache = None
+        self._watcher = None
+        self._refs = []
+        self._refs_lock = threading.Lock()
+        self._refs_compact_at = 1024
+        self._eager_refs = False
+        self._ref_refresher = None
+        # State kept between loads for incremental reloads
+        self._source_layers = {}
+        self._source_tokens = {}
+        self._last_load = None
+        self._published_version = 0
+        self._defaults_version = 0
+        self._env_tracking = threading.local()
+        # Statistics of the last load, recorded when enabled with enable_load_stats() or on_load_stats()
+        self.load_stats = None
+        self._record_load_stats = False
+        self._load_stats_hooks = []
+        self._current_stats = None
+        # Counts of the reads of each key, when enabled with enable_access_stats()
+        self._access_stats = None
+        # Versions replaced by the last loads, when enabled with keep_history()
+        self._history = None
+        # Sharing the configuration with other processes, see publish_shared_memory() and attach_shared_memory()
+        self._shared_publisher = None
+        self._shared_reader = None
+        self._shared_poller = None
         self.registry_lock = threading.RLock()
         self.cache_lock = threading.RLock()
         if not manual_init:
-            auto_register = entry_points(group="zirconium.parsers")
-            for ep in auto_register:
-                self.parsers.append(ep.load()(self))
-            auto_register = entry_points(group="zirconium.config")
+            auto_register = cached_entry_points("zirconium.config")
             for ep in auto_register:
                 registrar_func = ep.load()
                 registrar_func(self)
             self.ach.execute_hooks(self)
             self.init()
 
+    @property
+    def d(self):
+        return (self._pinned.get() or self._live)[0]
+
+    @d.setter
+    def d(self, root):
+        self._live = (root, self._live[1], object())
+
+    @property
+    def _index(self):
+        return (self._pinned.get() or self._live)[1]
+
+    @_index.setter
+    def _index(self, index):
+        self._live = (self._live[0], index, object())
+
+    def _writable(self):
+        # Writes always apply to the live version, even from within a snapshot
+        root, index, _ = self._live
+        return MutableDeepDict._shallow_copy(root), copy_index(index)
+
+    def _publish(self, root, index):
+        # A single reference swap, so readers see either the old or the new version, never a mix
+        self._live = (root, index, object())
+
+    @contextlib.contextmanager
+    def snapshot(self):
+        """ Pin the current version of the configuration for the current thread or task, so that every read within
+            the block sees the same values even if the configuration is reloaded or modified meanwhile. """
+        token = self._pinned.set(self._pinned.get() or self._live)
+        try:
+            yield self
+        finally:
+            self._pinned.reset(token)
+
     def on_load(self, cb):
         self._on_load.append(cb)
 
+    def on_change(self, key, cb):
+        """ Call cb(old_value, new_value) after init() or reload_config() when anything at or below key changed """
+        self._change_subscribers.append((MutableDeepDict._path(key), cb))
+
+    def bind(self, key, cls: t.Type[VT]) -> ConfigBinding[VT]:
+        """ Bind a section of the configuration to a dataclass, NamedTuple or class with type annotations.
+
+            The field types are used to convert the values once, and the instance (available as the value property of
+            the returned binding) is rebuilt each time the configuration is loaded. Use a frozen dataclass or a
+            NamedTuple so that it can be shared safely.
+        """
+        if not self._init_flag:
+            self.init()
+        binding = ConfigBinding(MutableDeepDict._path(key), cls)
+        # Built from the live version even within a snapshot, and before another load can publish a newer one
+        with self.registry_lock:
+            binding.rebuild(self._live[0], self.resolve_environment_references)
+            self._bindings.add(binding)
+        return binding
+
+    def _rebuild_bindings(self, root):
+        for binding in list(self._bindings):
+            try:
+                binding.rebuild(root, self.resolve_environment_references)
+            except Exception as ex:
+                # The binding keeps the instance from the previous load, rather than failing the whole load
+                self.log.exception(f"Error binding configuration section {'.'.join(str(k) for k in binding.key)}: {ex}")
+
+    def _notify_changes(self, old_root, new_root):
+        changed = diff_trees(old_root, new_root)
+        if not changed:
+            return
+        changed_below = set()
+        for path in changed:
+            changed_below.update(path[:i] for i in range(len(path) + 1))
+        changed = set(changed)
+        for prefix, cb in list(self._change_subscribers):
+            # Notify when a value under the prefix changed, or when the prefix itself was replaced or removed
+            if prefix in changed_below or any(prefix[:i] in changed for i in range(len(prefix))):
+                yield cb(tree_value(old_root, prefix), tree_value(new_root, prefix))
+
     def get(self, *key, default=None, coerce=None, blank_to_none=False, raw=False, raise_error=False):
+        if self._access_stats is not None:
+            self._access_stats.record(key, "get")
+        value = self._get(key, default, coerce, blank_to_none, raw, raise_error)
+        if type(value) is list or _is_mapping(value):
+            # Sections and lists are shared with snapshots and older versions, so they must not be modified in place
+            return copy_tree(value)
+        return value
+
+    def _get(self, key: tuple, default=None, coerce=None, blank_to_none=False, raw=False, raise_error=False):
+        """ Implementation of get(), used by the as_*() methods so that their reads are not counted twice """
         key = self._expand_key(key)
         value = super().get(*key, default=default, raise_error=raise_error)
         if blank_to_none and value == "":
@@ -153,60 +422,24 @@ class ApplicationConfig(MutableDeepDict):
         return _ConfigRef[t.Any](self, 'get', key, **kwargs)
 
     def resolve_environment_references(self, value: str) -> str:
-        pos = 0
-        # Escape rule for $ is dollar signs that precede a bracket
-        # ${var}
-        # $${not_a_var}, equivalent to string ${not_a_var}
-        # $$${var}, equivalent to "${}".format(os.environ["var"])
-        # $$$${not_a var}, equivalent to string $${not_a_var}
-        #
-        # ${{\}} equivalent to os.environ["{}"]
-        # ${{\\\}} equivalent to os.environ["{\}"]
-        state = "buffering"
-        ref_buffer = ""
-        resolved = ""
-        for i in range(0, len(value)):
-            c = value[i]
-            if c == "$":
-                if state == "buffering":
-                    state = "opening_ref"
-                    continue
-                elif state == "opening_ref":
-                    resolved += "$"
-                    state = "buffering"
-                    continue
-            elif c == "{":
-                if state == "opening_ref":
-                    state = "in_ref"
-                    continue
-            elif c == "\\":
-                if state == "in_ref":
-                    state = "escaping_in_ref"
-                    continue
-                elif state == "escaping_in_ref":
-                    ref_buffer += "\\"
-                    state = "in_ref"
-                    continue
-            elif c == "}":
-                if state == "escaping_in_ref":
-                    ref_buffer += "}"
-                    state = "in_ref"
-                    continue
-                elif state == "in_ref":
-                    resolved += self.parse_env_reference(ref_buffer, "")
-                    ref_buffer = ""
-                    state = "buffering"
-                    continue
-            if state == "buffering":
-                resolved += c
-            elif state == "in_ref":
-                ref_buffer += c
-            elif state == "escaping_in_ref":
-                ref_buffer += "\\" + c
-                state = "in_ref"
-        if ref_buffer:
-            resolved += "${" + ref_buffer
-        return resolved
+        # Fast path, nothing to replace
+        if "$" not in value:
+            return value
+        template = compile_env_template(value)
+        if isinstance(template, str):
+            return template
+        tracking = getattr(self._env_tracking, "names", None)
+        if tracking is not None:
+            tracking.extend(segment[0] for segment in template if not isinstance(segment, str))
+        get_env_var = self.get_env_var
+        resolved = []
+        for segment in template:
+            if isinstance(segment, str):
+                resolved.append(segment)
+            else:
+                actual_val = get_env_var(segment[0])
+                resolved.append(segment[1] if actual_val is None else actual_val)
+        return "".join(resolved)
 
     def parse_env_reference(self, name, default_val=None):
         if "=" in name:
@@ -230,141 +463,530 @@ class ApplicationConfig(MutableDeepDict):
         if secret_provider not in self._secret_providers:
             self.log.warning(f"Secret provider {secret_provider} not found")
             return None
-        return self._secret_providers[secret_provider](secret_path)
+        value = self.secret_cache.get(secret_provider, secret_path, _MISSING)
+        if value is _MISSING:
+            value = self._secret_providers[secret_provider](secret_path)
+            if inspect.isawaitable(value):
+                value = run_awaitable(value)
+            self.secret_cache.put(secret_provider, secret_path, value)
+        return value
 
+    def set_secret_loading(self, max_workers: int = 8, timeout: t.Optional[float] = None):
+        """ Control how init() fetches secrets.
+
+            :param max_workers: Maximum number of secrets fetched at once (1 fetches them one at a time)
+            :param timeout: Seconds to wait for each provider call, after which the secret is treated as not found
+        """
+        self._secret_loading = (max_workers, timeout)
+
+    def fetch_secrets(self, secrets: t.Iterable[t.Tuple[str, str]]) -> dict:
+        """ Fetch many secrets at once, given as (secret_path, secret_provider) pairs.
+
+            Secrets are fetched concurrently, except that providers with a get_secrets(paths) method receive all their
+            secrets in one call. That method returns a dictionary of path to value (missing paths are not found).
+
+            :returns: A dictionary of (secret_path, secret_provider) to the value
+        """
+        return _fetched_values(self._fetch_secrets(secrets))
+
+    def _fetch_secrets(self, secrets: t.Iterable[t.Tuple[str, str]]) -> dict:
+        results, calls = self._plan_secret_calls(secrets)
+        max_workers, timeout = self._secret_loading
+        if (len(calls) < 2 or max_workers < 2) and timeout is None:
+            for call in calls:
+                self._store_secrets(results, call, self._call_secret_provider(*call))
+        elif calls:
+            self._fetch_secrets_concurrently(results, calls, max_workers, timeout)
+        return results
+
+    async def afetch_secrets(self, secrets: t.Iterable[t.Tuple[str, str]]) -> dict:
+        """ Asynchronous version of fetch_secrets(). Coroutine providers are awaited, others run in the executor. """
+        return _fetched_values(await self._afetch_secrets(secrets))
+
+    async def _afetch_secrets(self, secrets: t.Iterable[t.Tuple[str, str]]) -> dict:
+        import asyncio
+        results, calls = self._plan_secret_calls(secrets)
+        max_workers, timeout = self._secret_loading
+        limit = asyncio.Semaphore(max(1, max_workers))
+        loop = asyncio.get_running_loop()
+
+        async def _fetch(secret_provider, paths):
+            async with limit:
+                if _is_coroutine_callable(self._secret_provider_call(secret_provider)):
+                    pending_call = self._acall_secret_provider(secret_provider, paths)
+                else:
+                    pending_call = loop.run_in_executor(None, self._call_secret_provider, secret_provider, paths)
+                try:
+                    values = await asyncio.wait_for(pending_call, timeout)
+                except asyncio.TimeoutError:
+                    self.log.warning(f"Timed out fetching secrets {', '.join(paths)} from {secret_provider}")
+                    for path in paths:
+                        results[(path, secret_provider)] = _NOT_FETCHED
+                    return
+            self._store_secrets(results, (secret_provider, paths), values)
+
+        await asyncio.gather(*(_fetch(*call) for call in calls))
+        return results
+
+    def _plan_secret_calls(self, secrets: t.Iterable[t.Tuple[str, str]]) -> t.Tuple[dict, t.List[tuple]]:
+        """ Find the secrets that are cached, and group the others into calls of (secret_provider, paths) """
+        results = {}
+        pending = {}
+        for secret_path, secret_provider in secrets:
+            if (secret_path, secret_provider) in results:
+                continue
+            if secret_provider not in self._secret_providers:
+                self.log.warning(f"Secret provider {secret_provider} not found")
+                results[(secret_path, secret_provider)] = _NOT_FETCHED
+                continue
+            value = self.secret_cache.get(secret_provider, secret_path, _MISSING)
+            if value is _MISSING:
+                pending.setdefault(secret_provider, []).append(secret_path)
+            results[(secret_path, secret_provider)] = value
+        calls = []
+        for secret_provider, paths in pending.items():
+            if hasattr(self._secret_providers[secret_provider], "get_secrets"):
+                calls.append((secret_provider, paths))
+            else:
+                calls.extend((secret_provider, [path]) for path in paths)
+        return results, calls
+
+    def _secret_provider_call(self, secret_provider: str):
+        provider = self._secret_providers[secret_provider]
+        return provider.get_secrets if hasattr(provider, "get_secrets") else provider
+
+    def _call_secret_provider(self, secret_provider: str, paths: list) -> dict:
+        provider = self._secret_providers[secret_provider]
+        if hasattr(provider, "get_secrets"):
+            values = provider.get_secrets(paths)
+            return run_awaitable(values) if inspect.isawaitable(values) else values
+        value = provider(paths[0])
+        return {paths[0]: run_awaitable(value) if inspect.isawaitable(value) else value}
+
+    async def _acall_secret_provider(self, secret_provider: str, paths: list) -> dict:
+        provider = self._secret_providers[secret_provider]
+        if hasattr(provider, "get_secrets"):
+            return await provider.get_secrets(paths)
+        return {paths[0]: await provider(paths[0])}
+
+    def _store_secrets(self, results: dict, call: tuple, values: dict):
+        secret_provider, paths = call
+        for path in paths:
+            value = values.get(path)
+            self.secret_cache.put(secret_provider, path, value)
+            results[(path, secret_provider)] = value
+
+    def _fetch_secrets_concurrently(self, results: dict, calls: list, max_workers: int, timeout: t.Optional[float]):
+        started = {}
+
+        def _timed_call(index):
+            started[index] = time.monotonic()
+            return self._call_secret_provider(*calls[index])
+
+        workers = max(1, min(max_workers, len(calls)))
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="zirconium-secrets")
+        futures = {}
+        try:
+            for index in range(len(calls)):
+                futures[executor.submit(_timed_call, index)] = index
+            waiting = set(futures)
+            # Calls that timed out, which keep their worker until they return
+            timed_out = set()
+
+            def _give_up(future, message):
+                waiting.discard(future)
+                secret_provider, paths = calls[futures[future]]
+                self.log.warning(f"{message} {', '.join(paths)} from {secret_provider}")
+                for path in paths:
+                    results[(path, secret_provider)] = _NOT_FETCHED
+
+            while waiting:
+                wait_for = None
+                if timeout is not None:
+                    # Each call gets timeout seconds from when it starts, not from when it was queued
+                    now = time.monotonic()
+                    wait_for = timeout
+                    for future in list(waiting):
+                        index = futures[future]
+                        if index not in started or future.done():
+                            continue
+                        remaining = started[index] + timeout - now
+                        if remaining <= 0:
+                            timed_out.add(future)
+                            _give_up(future, "Timed out fetching secrets")
+                        else:
+                            wait_for = min(wait_for, remaining)
+                    if sum(1 for future in timed_out if not future.done()) >= workers:
+                        # Every worker is stuck on a call that timed out, so the queued calls would never start
+                        for future in list(waiting):
+                            if futures[future] not in started and future.cancel():
+                                _give_up(future, "No worker left to fetch secrets")
+                    if not waiting:
+                        break
+                done, _ = wait(waiting, timeout=wait_for, return_when=FIRST_COMPLETED)
+                for future in done:
+                    waiting.discard(future)
+                    self._store_secrets(results, calls[futures[future]], future.result())
+        finally:
+            # Don't wait for calls that timed out, nor start those still queued (shutdown() only cancels them itself
+            # from Python 3.9)
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def set_secret_cache(self, ttl: float = 300, max_size: int = 1024):
+        """ Configure how long (in seconds) and how many secret values are kept, ttl=0 disables caching """
+        self.secret_cache.ttl = ttl
+        self.secret_cache.resize(max_size)
+        if ttl <= 0:
+            self.secret_cache.clear()
+
+    @_cached_getter
     def as_bytes(self, key: t.Union[t.Iterable, t.AnyStr], default=None, default_units: str = "b", allow_metric: bool = False, raw: bool = False) -> t.Union[int, float]:
-        val = self.get(key, default=default, blank_to_none=True, raw=raw)
+        val = self._get((key,), default=default, blank_to_none=True, raw=raw)
         if val is None:
             return val
-        elif isinstance(val, int) or isinstance(val, float):
-            return convert_to_bytes(val, default_units, not allow_metric)
-        else:
-            val, units = parse_for_units(str(val), 3, default_units)
-            return convert_to_bytes(val, units, not allow_metric)
+        return coerce_bytes(val, default_units, allow_metric)
 
     def as_bytes_ref(self, key: t.Union[t.Iterable, t.AnyStr], default=None, default_units="s", raw=False) -> _ConfigRef[t.Union[int, float]]:
         return _ConfigRef[t.Union[int, float]](self, 'as_bytes', key, default=default, default_units=default_units, raw=raw)
 
+    @_cached_getter
     def as_timedelta(self, key: t.Union[t.Iterable, t.AnyStr], default=None, default_units: str = "s", raw: bool = False) -> t.Optional[datetime.timedelta]:
-        val = self.get(key, default=default, blank_to_none=True, raw=raw)
-        if val is None or isinstance(val, datetime.timedelta):
+        val = self._get((key,), default=default, blank_to_none=True, raw=raw)
+        if val is None:
             return val
-        elif isinstance(val, int) or isinstance(val, float):
-            return convert_to_timedelta(val, default_units)
-        else:
-            val, units = parse_for_units(str(val), 2, default_units)
-            return convert_to_timedelta(val, units)
+        return coerce_timedelta(val, default_units)
 
     def as_timedelta_ref(self, key: t.Union[t.Iterable, t.AnyStr], default=None, default_units="s", raw=False) -> _ConfigRef[datetime.timedelta]:
         return _ConfigRef[datetime.timedelta](self, 'as_timedelta', key, default=default, default_units=default_units, raw=raw)
 
+    @_cached_getter
     def as_date(self, key: t.Union[t.Iterable, t.AnyStr], default=None, raw=False) -> t.Optional[datetime.date]:
-        dt = self.get(key, default=default, blank_to_none=True, raw=raw)
-        if isinstance(dt, datetime.datetime):
-            return datetime.date(dt.year, dt.month, dt.day)
-        elif dt is None or isinstance(dt, datetime.date):
+        dt = self._get((key,), default=default, blank_to_none=True, raw=raw)
+        if dt is None:
             return dt
-        else:
-            try:
-                return datetime.date.fromisoformat(dt)
-            except ValueError:
-                dt = datetime.datetime.fromisoformat(dt)
-                return datetime.date(dt.year, dt.month, dt.day)
+        return coerce_date(dt)
 
     def as_date_ref(self, key: t.Union[t.Iterable, t.AnyStr], default=None, raw=False) -> _ConfigRef[datetime.date]:
         return _ConfigRef[datetime.date](self, 'as_date', key, default=default, raw=raw)
 
+    @_cached_getter
     def as_datetime(self, key: t.Union[t.Iterable, t.AnyStr], default=None, tzinfo=None, raw=False) -> t.Optional[datetime.datetime]:
-        dt = self.get(key, default=default, blank_to_none=True, raw=raw)
+        dt = self._get((key,), default=default, blank_to_none=True, raw=raw)
         if dt is None:
             return None
-        if isinstance(dt, datetime.datetime):
-            if dt.tzinfo is None and tzinfo is not None:
-                return datetime.datetime(
-                    dt.year,
-                    dt.month,
-                    dt.day,
-                    dt.hour,
-                    dt.minute,
-                    dt.second,
-                    dt.microsecond,
-                    tzinfo
-                )
-            return dt
-        elif isinstance(dt, datetime.date):
-            return datetime.datetime(dt.year, dt.month, dt.day, 0, 0, 0, tzinfo=tzinfo)
-        else:
-            dt = datetime.datetime.fromisoformat(dt)
-            if dt.tzinfo is None and tzinfo is not None:
-                return datetime.datetime(
-                    dt.year,
-                    dt.month,
-                    dt.day,
-                    dt.hour,
-                    dt.minute,
-                    dt.second,
-                    dt.microsecond,
-                    tzinfo
-                )
-            return dt
+        return coerce_datetime(dt, tzinfo)
 
     def as_datetime_ref(self, key: t.Union[t.Iterable, t.AnyStr], default=None, tzinfo=None, raw=False) -> _ConfigRef[datetime.datetime]:
         return _ConfigRef[datetime.datetime](self, 'as_datetime', key, default=default, tzinfo=tzinfo, raw=raw)
 
+    @_cached_getter
     def as_int(self, key: t.Union[t.Iterable, t.AnyStr], default=None, raw=False) -> t.Optional[int]:
-        return self.get(key, default=default, coerce=int, blank_to_none=True, raw=raw)
+        return self._get((key,), default=default, coerce=int, blank_to_none=True, raw=raw)
 
     def as_int_ref(self, key: t.Union[t.Iterable, t.AnyStr], default=None, raw=False) -> _ConfigRef[int]:
         return _ConfigRef[int](self, 'as_int', key, default=default, raw=raw)
 
+    @_cached_getter
     def as_float(self, key: t.Union[t.Iterable, t.AnyStr], default=None, raw=False) -> t.Optional[float]:
-        return self.get(key, default=default, coerce=float, blank_to_none=True, raw=raw)
+        return self._get((key,), default=default, coerce=float, blank_to_none=True, raw=raw)
 
     def as_float_ref(self, key: t.Union[t.Iterable, t.AnyStr], default=None, raw=False) -> _ConfigRef[float]:
         return _ConfigRef[float](self, 'as_float', key, default=default, raw=raw)
 
+    @_cached_getter
     def as_decimal(self, key: t.Union[t.Iterable, t.AnyStr], default=None, raw=False) -> t.Optional[decimal.Decimal]:
-        return self.get(key, default=default, coerce=decimal.Decimal, blank_to_none=True, raw=raw)
+        return self._get((key,), default=default, coerce=decimal.Decimal, blank_to_none=True, raw=raw)
 
     def as_decimal_ref(self, key: t.Union[t.Iterable, t.AnyStr], default=None, raw=False) -> _ConfigRef[decimal.Decimal]:
         return _ConfigRef[decimal.Decimal](self, 'as_decimal', key, default=default, raw=raw)
 
+    @_cached_getter
     def as_str(self, key: t.Union[t.Iterable, t.AnyStr], default=None, raw=False) -> t.Optional[str]:
-        return self.get(key, default=default, coerce=str, raw=raw)
+        return self._get((key,), default=default, coerce=str, raw=raw)
 
     def as_str_ref(self, key: t.Union[t.Iterable, t.AnyStr], default=None, raw=False) -> _ConfigRef[str]:
         return _ConfigRef[str](self, 'as_float', key, default=default, raw=raw)
 
+    @_cached_getter
     def as_bool(self, key: t.Union[t.Iterable, t.AnyStr], default=None, raw=False) -> t.Optional[bool]:
-        return bool(self.get(key, default=default, raw=raw))
+        return bool(self._get((key,), default=default, raw=raw))
 
     def as_bool_ref(self, key: t.Union[t.Iterable, t.AnyStr], default=None, raw=False) -> _ConfigRef[bool]:
         return _ConfigRef[bool](self, 'as_bool', key, default=default, raw=raw)
 
+    @_cached_getter
     def as_path(self, key: t.Union[t.Iterable, t.AnyStr], default=None, raw=False) -> t.Optional[Path]:
-        return self.get(key, default=default, coerce=Path, blank_to_none=True, raw=raw)
+        return self._get((key,), default=default, coerce=Path, blank_to_none=True, raw=raw)
 
     def as_path_ref(self, key: t.Union[t.Iterable, t.AnyStr], default=None, raw=False) -> _ConfigRef[Path]:
         return _ConfigRef[Path](self, 'as_path', key, default=default, raw=raw)
 
+    @_recorded_getter
     def as_set(self, key: t.Union[t.Iterable, t.AnyStr], default=None) -> t.Optional[set]:
-        return self.get(key, default=default, coerce=set, blank_to_none=True, raw=True)
+        return self._get((key,), default=default, coerce=set, blank_to_none=True, raw=True)
 
     def as_set_ref(self, key: t.Union[t.Iterable, t.AnyStr], default=None) -> _ConfigRef[set]:
         return _ConfigRef[set](self, 'as_set', key, default=default)
 
+    @_recorded_getter
     def as_list(self, key: t.Union[t.Iterable, t.AnyStr], default=None) -> t.Optional[list]:
-        return self.get(key, default=default, coerce=list, blank_to_none=True, raw=True)
+        return self._get((key,), default=default, coerce=list, blank_to_none=True, raw=True)
 
     def as_list_ref(self, key: t.Union[t.Iterable, t.AnyStr], default=None) -> _ConfigRef[list]:
         return _ConfigRef[list](self, 'as_list', key, default=default)
 
+    @_recorded_getter
     def as_dict(self, key: t.Union[t.Iterable, t.AnyStr], default=None) -> t.Optional[dict]:
-        return self.get(key, default=default, coerce=MutableDeepDict, blank_to_none=True, raw=True)
+        # A copy, since the section is shared with snapshots and older versions
+        return self._get((key,), default=default, coerce=_copied_dict, blank_to_none=True, raw=True)
 
     def as_dict_ref(self, key: t.Union[t.Iterable, t.AnyStr], default=None) -> _ConfigRef[dict]:
         return _ConfigRef[dict](self, 'as_dict', key, default=default)
 
+    def set_cache_size(self, max_size: int):
+        """ Set the number of coerced values kept by the as_*() methods (0 disables the cache) """
+        self._cached_gets.resize(max_size)
+
+    def cache_stats(self) -> dict:
+        """ Hit and miss counts for the as_*() cache """
+        return self._cached_gets.stats()
+
+    def _mutated(self):
+        self._tree_version += 1
+
+    def set_parallel_loading(self, enabled: bool = True, max_workers: t.Optional[int] = None, use_processes: bool = False):
+        """ Parse the registered files concurrently in init(). They are still merged in the same order.
+
+            :param max_workers: Maximum number of files parsed at once
+            :param use_processes: Use a process pool for parsers that are limited by the GIL (those with process_safe
+                set to True, e.g. YAML and TOML)
+        """
+        with self.registry_lock:
+            self._parallel_loading = (max_workers, use_processes) if enabled else None
+
+    def enable_parse_cache(self, cache_dir: t.Union[str, Path], max_size: int = 67108864, verify_hash: bool = False):
+        """ Cache the parsed content of configuration files on disk, so that unchanged files are not parsed again.
+
+            :param cache_dir: Directory to store the cache in, it can be shared by many processes
+            :param max_size: Maximum size of the cache in bytes
+            :param verify_hash: Also check a hash of the file content, not only its modification time and size
+        """
+        with self.registry_lock:
+            self._parse_cache = ParseCache(cache_dir, max_size, verify_hash)
+
+    def disable_parse_cache(self):
+        with self.registry_lock:
+            self._parse_cache = None
+
+    def enable_path_index(self, enabled: bool = True):
+        """ Maintain a flat index of every key path, so that deep lookups and find() cost a hash lookup per key """
+        with self.lock:
+            self._use_path_index = enabled
+            if enabled:
+                self.build_index()
+            else:
+                self.drop_index()
+
+    def enable_load_stats(self, enabled: bool = True):
+        """ Record how long each phase of init() and reload_config() takes, and how many bytes were read, into
+            load_stats. """
+        self._record_load_stats = enabled
+        if not enabled:
+            self.load_stats = None
+
+    def on_load_stats(self, cb):
+        """ Call cb with the LoadStats of each load (e.g. to forward them to a tracing system), enabling them """
+        self._load_stats_hooks.append(cb)
+        self._record_load_stats = True
+
+    def _begin_load_stats(self):
+        self._current_stats = LoadStats() if self._record_load_stats else None
+
+    def _end_load_stats(self):
+        stats = self._current_stats
+        self._current_stats = None
+        if stats is not None:
+            stats.finish()
+            self.load_stats = stats
+            for cb in self._load_stats_hooks:
+                cb(stats)
+
+    def _timed(self, phase: str, source=None):
+        stats = self._current_stats
+        if stats is None:
+            return _NOT_TIMED
+        return stats.phase(phase, None if source is None else str(source))
+
+    def keep_history(self, size: int = 10):
+        """ Keep the versions of the configuration replaced by the last size loads, to compare them with the current
+            one or to go back to them with rollback(). While history is kept, sections that did not change are shared
+            between versions, so each version only costs the memory of what changed. Use a size of 0 to stop keeping
+            them. """
+        with self.registry_lock:
+            if size > 0:
+                self._history = collections.deque(self._history or (), maxlen=size)
+            else:
+                self._history = None
+
+    @property
+    def history(self) -> t.List[dict]:
+        """ The versions replaced by the last loads, oldest first. They must not be modified. """
+        return list(self._history or ())
+
+    def rollback(self) -> bool:
+        """ Go back to the version replaced by the last load, until the configuration is reloaded. The on_change()
+            subscribers and bound classes are updated as for a load. Returns False if there is no such version. """
+        with self.lock, self.registry_lock:
+            if not self._history:
+                return False
+            root = self._history.pop()
+            old_root = self._replace_root(root)
+            self._mutated()
+            if self._change_subscribers:
+                for result in self._notify_changes(old_root, root):
+                    if inspect.isawaitable(result):
+                        run_awaitable(result)
+            return True
+
+    def _replace_root(self, root):
+        """ Publish a whole new root which was not built by a load, returning the previous one """
+        old_root = self._live[0]
+        index = None
+        if self._use_path_index:
+            index = {}
+            MutableDeepDict._index_subtree(index, (), root)
+        self._publish(root, index)
+        self.cache_identifier = (self.cache_identifier or 0) + 1
+        self._rebuild_bindings(root)
+        return old_root
+
+    def publish_shared_memory(self, name: str):
+        """ Publish the configuration into shared memory now and after each load, so that other processes (e.g. the
+            workers of a pre-fork server) can read it with attach_shared_memory(name) instead of loading it themselves.
+            Call stop_sharing() to remove the shared memory. The name can be at most 43 bytes long.
+
+            :returns: The SharedConfigPublisher
+        """
+        # sharedmem imports multiprocessing.shared_memory, which only processes sharing their configuration need
+        from .sharedmem import SharedConfigPublisher
+        with self.registry_lock:
+            if self._shared_publisher is None:
+                self._shared_publisher = SharedConfigPublisher(name)
+            if self._init_flag:
+                self._shared_publisher.publish(self._live[0])
+            return self._shared_publisher
+
+    def attach_shared_memory(self, name: str, poll_interval: float = 1.0):
+        """ Read the configuration published by another process with publish_shared_memory(name), instead of loading
+            it. Values are decoded from the shared memory when they are read, so the process never holds a copy of the
+            whole configuration.
+
+            reload_config() switches to the latest version published, and so does a background thread that checks for
+            one every poll_interval seconds (unless it is 0). Writes only change the configuration of this process, until
+            the next version is published.
+        """
+        from .sharedmem import SharedConfigReader
+        self.stop_sharing()
+        with self.lock, self.registry_lock:
+            self._shared_reader = SharedConfigReader(name)
+            self._refresh_shared(True)
+            if poll_interval > 0:
+                stop = threading.Event()
+                thread = threading.Thread(
+                    target=self._poll_shared,
+                    args=(self._shared_reader, stop, poll_interval),
+                    name="zirconium-shared-memory",
+                    daemon=True
+                )
+                self._shared_poller = (thread, stop)
+                thread.start()
+
+    def stop_sharing(self):
+        """ Stop publishing the configuration into shared memory (removing it) or reading it from shared memory """
+        with self.registry_lock:
+            poller = self._shared_poller
+            self._shared_poller = None
+        # Joined without holding the lock, which the poller needs to finish a reload
+        if poller is not None:
+            poller[1].set()
+            if poller[0] is not threading.current_thread():
+                poller[0].join()
+        with self.registry_lock:
+            if self._shared_reader is not None:
+                self._shared_reader.close()
+                self._shared_reader = None
+            if self._shared_publisher is not None:
+                self._shared_publisher.close()
+                self._shared_publisher = None
+
+    def _poll_shared(self, reader, stop: threading.Event, poll_interval: float):
+        while not stop.wait(poll_interval):
+            try:
+                if reader.changed():
+                    self.log.info("New configuration published in shared memory, reloading")
+                    self.reload_config()
+            except Exception as ex:
+                self.log.exception(f"Error reading configuration from shared memory: {ex}")
+
+    def _refresh_shared(self, force: bool = False) -> bool:
+        """ Switch to the latest version in shared memory, as if it was loaded. Returns False if there is none. """
+        with self.registry_lock:
+            root = self._shared_reader.refresh(force)
+            if root is None:
+                return False
+            old_root = self._replace_root(root)
+            self._published_version = self._tree_version
+            self._init_flag = True
+            for result in self._load_callbacks(old_root, root):
+                if inspect.isawaitable(result):
+                    run_awaitable(result)
+            return True
+
+    def enable_access_stats(self, enabled: bool = True, sample_every: int = 1):
+        """ Count the reads made with get(), [] and the as_*() methods, by key and method, to find the keys that are
+            read most often and those that are never read (see access_report()).
+
+            :param sample_every: Only count one read in this many (in each thread), to lower the cost of counting
+        """
+        self._access_stats = AccessStats(sample_every) if enabled else None
+
+    def access_report(self, top: int = 20) -> t.Optional[dict]:
+        """ Report on the reads counted since enable_access_stats() was called (see AccessStats.report()), or None
+            if they are not being counted. Keys are reported as tuples. """
+        stats = self._access_stats
+        if stats is None:
+            return None
+        return stats.report(self.d, lambda key: tuple(self._expand_key(key)), top)
+
+    def enable_eager_refs(self, enabled: bool = True):
+        """ Recompute the value of every live _ConfigRef on a background thread after each load, instead of on their
+            next use """
+        self._eager_refs = enabled
+
+    def _register_ref(self, ref: _ConfigRef):
+        with self._refs_lock:
+            self._refs.append(weakref.ref(ref))
+            if len(self._refs) >= self._refs_compact_at:
+                self._refs = [r for r in self._refs if r() is not None]
+                self._refs_compact_at = max(1024, len(self._refs) * 2)
+
+    def _live_refs(self) -> t.List[_ConfigRef]:
+        refs = (r() for r in self._refs)
+        return [ref for ref in refs if ref is not None]
+
+    def _refresh_refs(self, identifier):
+        for ref in self._live_refs():
+            if self.cache_identifier != identifier:
+                # Reloaded again, a newer refresh takes over
+                return
+            try:
+                ref._ensure_cache()
+            except Exception as ex:
+                # Will fail again (and raise) when the ref is used
+                self.log.debug(f"Could not refresh reference to {ref.key}: {ex}")
+
     def set_default_encoding(self, enc):
         self.encoding = enc
 
@@ -374,8 +996,38 @@ class ApplicationConfig(MutableDeepDict):
         parent, k = self._navigate_to_item(key)
         return parent is not None and k in parent and bool(parent[k])
 
-    def register_parser(self, parser):
+    def find_parser(self, file_name: str):
+        """ Find the parser for a file name: parsers registered for its extension first, then the built-in parsers,
+            then those from entry points, then the other parsers registered with register_parser() """
+        suffix = file_name[file_name.rfind("."):].lower() if "." in file_name else ""
+        parser = self._suffix_parsers.get(suffix)
+        if parser is not None and parser.handles(file_name):
+            return parser
+        if suffix in BUILTIN_PARSERS:
+            parser = self._builtin_parsers.get(suffix)
+            if parser is None:
+                parser = self._builtin_parsers.setdefault(suffix, BUILTIN_PARSERS[suffix]())
+            if parser.handles(file_name):
+                return parser
+        if self._entry_point_parsers is None:
+            with self.registry_lock:
+                if self._entry_point_parsers is None:
+                    self._entry_point_parsers = [ep.load()(self) for ep in cached_entry_points("zirconium.parsers")]
+        for parser in self._entry_point_parsers:
+            if parser.handles(file_name):
+                return parser
+        for parser in self.parsers:
+            if parser.handles(file_name):
+                return parser
+        return None
+
+    def register_parser(self, parser, suffixes: t.Iterable[str] = ()):
+        """ Add a parser for the files it handles. Give it suffixes (such as ".yaml") to use it instead of the
+            built-in parser for files with those extensions. """
         self.parsers.append(parser)
+        for suffix in suffixes:
+            suffix = suffix.lower()
+            self._suffix_parsers[suffix if suffix.startswith(".") else f".{suffix}"] = parser
 
     def register_secret_provider(self, name, callback):
         self._secret_providers[name] = callback
@@ -420,16 +1072,76 @@ class ApplicationConfig(MutableDeepDict):
     def register_environ_map(self, env_map):
         self.environment_map.update(env_map)
 
-    def reload_config(self):
+    def reload_config(self, full: bool = False):
+        """ Reload the configuration from its sources.
+
+            Only files whose change token (modification time and size by default) changed are parsed again, and secrets
+            are taken from the secret cache until they expire. If nothing changed and the configuration was not modified
+            since the last load, nothing is done. Pass full=True to re-read every file and secret.
+        """
         # We take all three locks to prevent any weird multi-threaded behaviour from happening. All writes are blocked until we are done the re-load except our own.
+        # The load lock comes first, since an asynchronous load takes the others from executor threads while holding it.
+        with self._load_lock.held_by_thread(), self.lock:
+            with self.registry_lock:
+                with self.cache_lock:
+                    if self._prepare_reload(full):
+                        self.init()
+
+    def _prepare_reload(self, full: bool) -> bool:
+        """ Reset the state kept from the last load, returns False if there is nothing to reload """
         with self.lock:
             with self.registry_lock:
                 with self.cache_lock:
-                    self._cached_gets = {}
+                    if self._shared_reader is not None:
+                        # Loaded by the process which publishes it
+                        self._refresh_shared()
+                        return False
+                    if full:
+                        self._source_layers = {}
+                        self.secret_cache.clear()
+                    elif self._init_flag and self._sources_unchanged():
+                        self.log.debug("Configuration sources unchanged, skipping reload")
+                        return False
+                    self._cached_gets.clear()
                     self.loaded_files = []
                     self._init_flag = False
-                    self.clear()
-                    self.init()
+                    return True
+
+    def _sources_unchanged(self) -> bool:
+        """ Check if a reload would produce the same configuration as the last load """
+        if self._last_load is None or self._tree_version != self._published_version:
+            return False
+        sources = self._resolve_sources(check_loaded=False)
+        if self._last_load != (sources, self._environment_values(), tuple(self.secrets_map), self._defaults_version):
+            return False
+        if any((sprovider, spath) not in self.secret_cache for spath, sprovider, _ in self.secrets_map.values()):
+            # Secrets that expired, or could not be fetched last time, are fetched again
+            return False
+        for source in sources:
+            token = self._change_token(*source)
+            if token is None or self._source_tokens.get(source) != token:
+                return False
+        return True
+
+    def watch(self, debounce: float = 0.5, poll_interval: float = 1.0, use_inotify: bool = True):
+        """ Start a background thread that reloads the configuration when the registered files change.
+
+            :param debounce: Seconds without further changes to wait for before reloading
+            :param poll_interval: Seconds between checks of the files (when inotify is not used)
+            :param use_inotify: Use inotify to notice changes immediately, where available
+        """
+        with self.registry_lock:
+            if self._watcher is None:
+                self._watcher = ConfigWatcher(self, debounce, poll_interval, use_inotify)
+                self._watcher.start()
+            return self._watcher
+
+    def stop_watching(self):
+        with self.registry_lock:
+            watcher = self._watcher
+            self._watcher = None
+        if watcher is not None:
+            watcher.stop()
 
     def register_secret_as_environ_var(self, secret_path, secret_provider, env_var_name):
         self.secrets_env_map[env_var_name] = (secret_path, secret_provider)
@@ -439,69 +1151,330 @@ class ApplicationConfig(MutableDeepDict):
         self.secrets_map[f"{secret_path}{secret_provider}"] = (secret_path, secret_provider, target_config)
 
     def init(self):
-        with self.registry_lock:
+        with self._load_lock.held_by_thread(), self.registry_lock:
+            if self._shared_reader is not None:
+                # Loaded by the process which publishes it
+                if not self._init_flag:
+                    self._refresh_shared(True)
+                return
             if not self._init_flag:
-                new_conf = MutableDeepDict()
-                new_conf.deep_update(self._default_config)
-                self.file_registry["defaults"].sort(key=lambda x: x[1])
-                for file, weight, parser, enc in self.file_registry["defaults"]:
-                    self.load_file(new_conf, file, parser, enc)
-                self.file_registry["regulars"].sort(key=lambda x: x[1])
-                for file, weight, parser, enc in self.file_registry["regulars"]:
-                    self.load_file(new_conf, file, parser, enc)
-                self.file_registry["environment"].sort(key=lambda x: x[1])
-                for env_name, weight, parser, enc in self.file_registry["environment"]:
-                    env_val = self.get_env_var(env_name)
-                    if env_val:
-                        self.load_file(new_conf, env_val, parser, enc)
+                self._begin_load_stats()
+                try:
+                    new_conf, sources = self._start_load()
+                    if self._parallel_loading is not None:
+                        self._load_files_concurrently(new_conf, sources)
+                    else:
+                        for source in sources:
+                            self._merge_source(new_conf, source, self._read_source(*source))
+                    with self._timed("secrets"):
+                        fetched = self._fetch_secrets(self._secrets_to_fetch())
+                    old_root = self._finish_load(new_conf, sources, fetched)
+                    for result in self._load_callbacks(old_root, new_conf.d):
+                        if inspect.isawaitable(result):
+                            run_awaitable(result)
+                finally:
+                    self._end_load_stats()
+
+    async def ainit(self):
+        """ Asynchronous version of init().
+
+            Files are parsed in the default executor (or with the parser's aread_dict() coroutine, if it has one) while
+            secrets are fetched (awaiting async providers directly), and the result is merged and published in the
+            executor as well, so the event loop is never blocked. Coroutine callbacks given to on_load() and on_change()
+            are awaited.
+        """
+        import asyncio
+        if self._shared_reader is not None:
+            # Loaded by the process which publishes it
+            await asyncio.get_running_loop().run_in_executor(None, self.init)
+            return
+        async with self._load_lock.held_by_task():
+            await self._aload()
+
+    async def _aload(self):
+        """ Load the configuration, called with the load lock held """
+        import asyncio
+        if self._init_flag:
+            return
+        self._begin_load_stats()
+        try:
+            loop = asyncio.get_running_loop()
+            new_conf, sources = await loop.run_in_executor(None, self._start_load)
+            layers, fetched = await asyncio.gather(
+                asyncio.gather(*(self._aread_source(*source) for source in sources)),
+                self._afetch_load_secrets()
+            )
+            old_root = await loop.run_in_executor(None, self._merge_and_finish, new_conf, sources, layers, fetched)
+            for result in self._load_callbacks(old_root, new_conf.d):
+                if inspect.isawaitable(result):
+                    await result
+        finally:
+            self._end_load_stats()
+
+    async def _afetch_load_secrets(self) -> dict:
+        with self._timed("secrets"):
+            return await self._afetch_secrets(self._secrets_to_fetch())
+
+    async def areload(self, full: bool = False):
+        """ Asynchronous version of reload_config() """
+        import asyncio
+        async with self._load_lock.held_by_task():
+            if await asyncio.get_running_loop().run_in_executor(None, self._prepare_reload, full):
+                await self.ainit()
+
+    def _start_load(self) -> t.Tuple[MutableDeepDict, t.List[tuple]]:
+        """ Start a new configuration from the defaults, and find the files to merge into it """
+        with self.registry_lock, self._timed("start"):
+            new_conf = MutableDeepDict()
+            new_conf.deep_update(copy_tree(self._default_config))
+            return new_conf, self._resolve_sources()
+
+    def _merge_and_finish(self, new_conf, sources, layers, fetched) -> dict:
+        with self.registry_lock:
+            for source, data in zip(sources, layers):
+                self._merge_source(new_conf, source, data)
+            return self._finish_load(new_conf, sources, fetched)
+
+    def _finish_load(self, new_conf, sources, fetched) -> dict:
+        """ Apply environment variables and secrets, then publish the new configuration. Returns the previous root. """
+        with self.registry_lock:
+            self._source_layers = {key: self._source_layers[key] for key in sources if key in self._source_layers}
+            self._source_tokens = {key: self._source_tokens[key] for key in sources if key in self._source_tokens}
+            with self._timed("environment"):
+                environ = self._environment_values()
                 for env_name, target_config in self.environment_map.items():
-                    env_val = self.get_env_var(env_name)
+                    env_val = environ[env_name]
                     if env_val is not None:
                         self.log.info(f"Setting config from environment variable {env_name}")
                         new_conf[target_config] = env_val
                     else:
                         self.log.debug(f"No environment variable set for {env_name}")
-                for key in self.secrets_map:
-                    spath, sprovider, target_config = self._secret_providers[key]
-                    secret_val = self.get_secret(sprovider, spath)
-                    if secret_val is not None:
-                        self.log.info(f"Loading secret from {sprovider} {spath}")
-                        new_conf[target_config] = secret_val
-                self.d = new_conf.d
-                self._init_flag = True
-                if self.cache_identifier is None:
-                    self.cache_identifier = 1
-                else:
-                    self.cache_identifier += 1
-                for cb in self._on_load:
-                    cb(self)
+            with self._timed("publish"):
+                return self._publish_load(new_conf, sources, environ, fetched)
+
+    def _publish_load(self, new_conf, sources, environ, fetched) -> dict:
+        """ Apply the secrets and publish the new configuration, called by _finish_load() with the registry lock held """
+        for key in self.secrets_map:
+            spath, sprovider, target_config = self.secrets_map[key]
+            secret_val = fetched[(spath, sprovider)]
+            if secret_val is not None and secret_val is not _NOT_FETCHED:
+                self.log.info(f"Loading secret from {sprovider} {spath}")
+                new_conf[target_config] = secret_val
+        self._last_load = (sources, environ, tuple(self.secrets_map), self._defaults_version)
+        old_root = self._live[0]
+        if self._history is not None:
+            # Sections that did not change are kept from the previous version, so that versions share them
+            new_conf.d = share_subtrees(old_root, new_conf.d)
+        if self._use_path_index:
+            new_conf.build_index()
+        if self._history is not None and old_root is not new_conf.d and self.cache_identifier is not None:
+            self._history.append(old_root)
+        # Built entirely off to the side, then published in one step
+        self._publish(new_conf.d, new_conf._index)
+        if self._shared_publisher is not None:
+            self._shared_publisher.publish(new_conf.d)
+        self._published_version = self._tree_version
+        self._init_flag = True
+        if self.cache_identifier is None:
+            self.cache_identifier = 1
+        else:
+            self.cache_identifier += 1
+        self._rebuild_bindings(new_conf.d)
+        if self._eager_refs and self._refs:
+            self._ref_refresher = threading.Thread(
+                target=self._refresh_refs,
+                args=(self.cache_identifier,),
+                name="zirconium-ref-refresh",
+                daemon=True
+            )
+            self._ref_refresher.start()
+        return old_root
+
+    def _load_callbacks(self, old_root, new_root):
+        """ Call the on_load() and on_change() callbacks, yielding their results so that coroutines can be awaited """
+        for cb in self._on_load:
+            # Coroutines are awaited before the generator resumes, so their time is included
+            with self._timed("callback", getattr(cb, "__qualname__", cb)):
+                yield cb(self)
+        if self._change_subscribers:
+            with self._timed("callback", "on_change"):
+                yield from self._notify_changes(old_root, new_root)
+
+    def _secrets_to_fetch(self) -> t.List[t.Tuple[str, str]]:
+        """ Secrets needed by init(), plus those referenced by environment variables so that they are cached """
+        secrets = [
+            (spath, sprovider)
+            for spath, sprovider, _ in self.secrets_map.values()
+        ]
+        if self.secret_cache.ttl > 0:
+            for env_var_name, secret in self.secrets_env_map.items():
+                if not any(name in os.environ for name in (env_var_name, env_var_name.lower(), env_var_name.upper())):
+                    secrets.append(secret)
+        return secrets
+
+    def _environment_values(self) -> dict:
+        return {env_name: self.get_env_var(env_name) for env_name in self.environment_map}
+
+    def _registered_files(self) -> t.List[tuple]:
+        """ List the registered files, as (path, parser, encoding), in the order they are merged """
+        files = []
+        for registry in ("defaults", "regulars"):
+            self.file_registry[registry].sort(key=lambda x: x[1])
+            files.extend((file, parser, enc) for file, weight, parser, enc in self.file_registry[registry])
+        self.file_registry["environment"].sort(key=lambda x: x[1])
+        for env_name, weight, parser, enc in self.file_registry["environment"]:
+            env_val = self.get_env_var(env_name)
+            if env_val:
+                files.append((env_val, parser, enc))
+        return files
+
+    def _resolve_sources(self, check_loaded: bool = True) -> t.List[tuple]:
+        """ Find the files to load, as (full path, parser, encoding), in the order they are merged """
+        resolved = []
+        planned = set()
+        for file, parser, enc in self._registered_files():
+            source = self._resolve_file(file, parser, enc, planned, check_loaded)
+            if source is not None:
+                planned.add(source[0])
+                resolved.append(source)
+        return resolved
+
+    def _resolve_file(self, file_path, parser=None, encoding=None, skip=None, check_loaded=True) -> t.Optional[tuple]:
+        """ Find the full path, parser and encoding for a file, or None if it should not be loaded """
+        if encoding is None:
+            encoding = self.encoding
+        if isinstance(file_path, str) and "://" in file_path:
+            # URLs (e.g. for DbConfigParser) are not files, and are only loaded by a parser that handles them
+            url_parser = parser or self.find_parser(file_path)
+            if url_parser is not None and url_parser.handles(file_path):
+                if (check_loaded and file_path in self.loaded_files) or (skip and file_path in skip):
+                    return None
+                return file_path, url_parser, encoding
+        file_path = Path(file_path).expanduser().absolute()
+        if (check_loaded and file_path in self.loaded_files) or (skip and file_path in skip):
+            return None
+        if not file_path.exists():
+            self.log.info(f"No config file found at {file_path}")
+            return None
+        if not parser:
+            parser = self.find_parser(file_path.name)
+            if parser is None:
+                self.log.warning(f"No parser found for {file_path}")
+                return None
+        return file_path, parser, encoding
+
+    def _change_token(self, file_path, parser, encoding):
+        """ Value that changes whenever the content of the file does (None if it can't be determined) """
+        if hasattr(parser, "change_token"):
+            return parser.change_token(file_path, encoding)
+        try:
+            st = os.stat(file_path)
+            return st.st_mtime_ns, st.st_size, st.st_ino
+        except OSError:
+            return None
+
+    def _read_source(self, file_path, parser, encoding, process_pool=None) -> dict:
+        """ Read a file, re-using the content from the last load if its change token is the same """
+        source = (file_path, parser, encoding)
+        with self._timed("read", file_path) as details:
+            token, data = self._unchanged_layer(source)
+            if details is not None:
+                details["size"] = file_size(file_path)
+                details["reused"] = data is not None
+            if data is None:
+                data = self._read_file(file_path, parser, encoding, process_pool)
+                self._keep_layer(source, token, data)
+        return data
+
+    async def _aread_source(self, file_path, parser, encoding) -> dict:
+        """ Asynchronous version of _read_source(), for use in ainit() """
+        if not hasattr(parser, "aread_dict"):
+            import asyncio
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self._read_source, file_path, parser, encoding)
+        source = (file_path, parser, encoding)
+        with self._timed("read", file_path) as details:
+            token, data = self._unchanged_layer(source)
+            if details is not None:
+                details["size"] = file_size(file_path)
+                details["reused"] = data is not None
+            if data is None:
+                data = await parser.aread_dict(file_path, encoding)
+                self._keep_layer(source, token, data)
+        return data
+
+    def _unchanged_layer(self, source: tuple) -> t.Tuple[t.Any, t.Optional[dict]]:
+        """ Find the change token of a source, and the content from the last load if it is the same """
+        token = self._change_token(*source)
+        self._source_tokens[source] = token
+        layer = self._source_layers.get(source)
+        if layer is not None and token is not None and layer[0] == token:
+            self.log.debug(f"Config file {source[0]} unchanged")
+            return token, layer[1]
+        self.log.info(f"Loading config file {source[0]}")
+        return token, None
+
+    def _keep_layer(self, source: tuple, token, data: dict):
+        if getattr(source[1], "cacheable", True):
+            self._source_layers[source] = (token, data)
+
+    def _read_file(self, file_path, parser, encoding, process_pool=None) -> dict:
+        # Only files can be checked for changes by the parse cache
+        cache = self._parse_cache if isinstance(file_path, Path) and getattr(parser, "cacheable", True) else None
+        if cache is not None:
+            data, stamp = cache.lookup(file_path, parser, encoding)
+            if data is not None:
+                self.log.debug(f"Using cached content for {file_path}")
+                return data
+        if process_pool is not None and getattr(parser, "process_safe", False):
+            data = process_pool.submit(parser.read_dict, file_path, encoding).result()
+        elif not hasattr(parser, "read_dict"):
+            # Parsers with only an asynchronous method can still be used by init()
+            data = run_awaitable(parser.aread_dict(file_path, encoding))
+        else:
+            data = parser.read_dict(file_path, encoding)
+        if cache is not None:
+            cache.store(file_path, parser, encoding, stamp, data)
+        return data
+
+    def _merge_source(self, new_conf, source, data):
+        # Content kept for the next reload must not be modified by merging later files into it
+        with self._timed("merge", source[0]):
+            if getattr(source[1], "cacheable", True):
+                data = copy_tree(data)
+            new_conf.deep_update(data)
+        self.loaded_files.append(source[0])
 
     def load_file(self, new_conf, file_path, parser=None, encoding=None):
         with self.registry_lock:
-            if encoding is None:
-                encoding = self.encoding
-            file_path = Path(file_path).expanduser().absolute()
-            if file_path in self.loaded_files:
-                return
-            if file_path.exists():
-                if parser:
-                    self.log.info(f"Loading config file {file_path}")
-                    new_conf.deep_update(parser.read_dict(file_path, encoding))
-                    self.loaded_files.append(file_path)
-                else:
-                    for parser in self.parsers:
-                        if parser.handles(file_path.name):
-                            self.log.info(f"Loading config file {file_path}")
-                            new_conf.deep_update(parser.read_dict(file_path, encoding))
-                            self.loaded_files.append(file_path)
-                            break
-                    else:
-                        self.log.warning(f"No parser found for {file_path}")
-            else:
-                self.log.info(f"No config file found at {file_path}")
+            source = self._resolve_file(file_path, parser, encoding)
+            if source is not None:
+                self.log.info(f"Loading config file {source[0]}")
+                new_conf.deep_update(self._read_file(*source))
+                self.loaded_files.append(source[0])
+
+    def _load_files_concurrently(self, new_conf, sources):
+        """ Parse the files concurrently, then merge them in order """
+        if not sources:
+            return
+        max_workers, use_processes = self._parallel_loading
+        process_pool = None
+        if use_processes and any(getattr(source[1], "process_safe", False) for source in sources):
+            # Imported here since multiprocessing is slow to import and rarely needed
+            from concurrent.futures import ProcessPoolExecutor
+            process_pool = ProcessPoolExecutor(max_workers=max_workers)
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as thread_pool:
+                futures = [thread_pool.submit(self._read_source, *source, process_pool) for source in sources]
+                for source, future in zip(sources, futures):
+                    self._merge_source(new_conf, source, future.result())
+        finally:
+            if process_pool is not None:
+                process_pool.shutdown()
 
     def set_defaults(self, d):
         self._default_config.update(d)
+        self._defaults_version += 1
 
     def load_from_dict(self, d):
         self.deep_update(d)
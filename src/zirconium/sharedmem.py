@@ -0,0 +1,300 @@
+""" Sharing a configuration between processes through shared memory.
+
+    A publisher (e.g. the master process of a pre-fork server) encodes the configuration into a shared memory segment,
+    in a form where each dictionary is a table of keys and the offsets of their values, so readers only decode what
+    they look up. A small control segment holds the name of the current segment and a generation number, which
+    readers check to switch to the segment of a newer version.
+"""
+import collections.abc
+import pickle
+import struct
+import time
+import typing as t
+from multiprocessing import shared_memory
+
+from .utils import MutableDeepDict
+
+
+# Data segments start with the magic, the offset of the root dictionary and the length of the encoded data
+_DATA_MAGIC = b"ZRC1"
+_DATA_HEADER = struct.Struct("<4sQQ")
+# Dictionaries are a tag and a number of entries, followed by (key offset, key length, value offset) for each entry
+_NODE = struct.Struct("<cQ")
+_ENTRY = struct.Struct("<QQQ")
+# Other values are a tag and the length of the payload
+_LEAF = struct.Struct("<cQ")
+_DICT = b"D"
+_STR = b"S"
+_PICKLE = b"P"
+
+# The control segment holds the magic, a sequence number (odd while the rest is being written), the generation and the
+# name of the current data segment
+_CONTROL_MAGIC = b"ZRCC"
+_CONTROL = struct.Struct("<4s4xQQ64s")
+# Data segments are called "{name}.{generation}", which must fit in the 64 bytes of the control segment
+_MAX_NAME_LENGTH = 64 - len(f".{2 ** 64 - 1}")
+# Times to look for the latest data segment, when it keeps being replaced before it can be opened
+_REFRESH_ATTEMPTS = 10
+
+# Segments created by publishers in this process, which the resource tracker must keep tracking
+_created_here = set()
+
+
+def _encode_key(key) -> bytes:
+    if isinstance(key, str):
+        return b"s" + key.encode("utf-8")
+    return b"p" + pickle.dumps(key, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _is_node(value) -> bool:
+    return isinstance(value, (dict, MutableDeepDict, collections.abc.Mapping))
+
+
+def encode_tree(root) -> bytes:
+    """ Encode a configuration tree into the layout read by SharedMapping """
+    out = bytearray(_DATA_HEADER.size)
+
+    def _encode(value) -> int:
+        if isinstance(value, MutableDeepDict):
+            value = value.d
+        if _is_node(value):
+            entries = sorted((_encode_key(k), _encode(v)) for k, v in value.items())
+            key_offsets = []
+            for key, _ in entries:
+                key_offsets.append(len(out))
+                out.extend(key)
+            offset = len(out)
+            out.extend(_NODE.pack(_DICT, len(entries)))
+            for key_offset, (key, value_offset) in zip(key_offsets, entries):
+                out.extend(_ENTRY.pack(key_offset, len(key), value_offset))
+            return offset
+        if type(value) is str:
+            tag, payload = _STR, value.encode("utf-8")
+        else:
+            tag, payload = _PICKLE, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        offset = len(out)
+        out.extend(_LEAF.pack(tag, len(payload)))
+        out.extend(payload)
+        return offset
+
+    root_offset = _encode(root)
+    _DATA_HEADER.pack_into(out, 0, _DATA_MAGIC, root_offset, len(out))
+    return bytes(out)
+
+
+class SharedMapping(collections.abc.Mapping):
+    """ Read-only dictionary over an encoded configuration tree. The keys of a dictionary are only decoded the first
+        time one of them is looked up, and values are decoded each time they are read (except dictionaries, which are
+        kept), so the parts of the tree that are never read are never decoded. """
+
+    __slots__ = ("_buf", "_offset", "_count", "_segment", "_offsets", "_children")
+
+    def __init__(self, buf, offset: int, segment=None):
+        self._buf = buf
+        self._offset = offset
+        self._count = _NODE.unpack_from(buf, offset)[1]
+        # Keeps the shared memory mapped for as long as a value from it is in use
+        self._segment = segment
+        # {key: offset of the value}, built on the first lookup
+        self._offsets = None
+        self._children = {}
+
+    def _entry(self, i: int) -> tuple:
+        return _ENTRY.unpack_from(self._buf, self._offset + _NODE.size + i * _ENTRY.size)
+
+    def _find(self, key) -> int:
+        if self._offsets is None:
+            self._offsets = {self._key(i): self._entry(i)[2] for i in range(self._count)}
+        return self._offsets.get(key, -1)
+
+    def _decode(self, offset: int):
+        tag, length = _LEAF.unpack_from(self._buf, offset)
+        if tag == _DICT:
+            child = self._children.get(offset)
+            if child is None:
+                child = self._children[offset] = SharedMapping(self._buf, offset, self._segment)
+            return child
+        start = offset + _LEAF.size
+        if tag == _STR:
+            return str(self._buf[start:start + length], "utf-8")
+        return pickle.loads(self._buf[start:start + length])
+
+    def _key(self, i: int):
+        key_offset, key_length, _ = self._entry(i)
+        data = self._buf[key_offset + 1:key_offset + key_length]
+        if self._buf[key_offset:key_offset + 1] == b"s":
+            return str(data, "utf-8")
+        return pickle.loads(data)
+
+    def __getitem__(self, key):
+        try:
+            offset = self._find(key)
+        except TypeError:
+            raise KeyError(key)
+        if offset < 0:
+            raise KeyError(key)
+        return self._decode(offset)
+
+    def __contains__(self, key):
+        try:
+            return self._find(key) >= 0
+        except TypeError:
+            return False
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self._key(i)
+
+    def __len__(self):
+        return self._count
+
+    def items(self):
+        return [(self._key(i), self._decode(self._entry(i)[2])) for i in range(self._count)]
+
+    def values(self):
+        return [self._decode(self._entry(i)[2]) for i in range(self._count)]
+
+    def copy(self) -> dict:
+        """ Shallow copy, as a dictionary """
+        return dict(self.items())
+
+    def __repr__(self):
+        return f"SharedMapping({dict(self.items())!r})"
+
+
+def attach_segment(name: str) -> shared_memory.SharedMemory:
+    """ Open an existing segment without registering it with the resource tracker, which would otherwise remove it
+        when this process exits even though the publisher still uses it """
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        # Before Python 3.13, attaching registers the segment like creating it does
+        from multiprocessing import resource_tracker
+        segment = shared_memory.SharedMemory(name)
+        if segment._name not in _created_here:
+            resource_tracker.unregister(segment._name, "shared_memory")
+        return segment
+
+
+def _remove_segment(name: str):
+    if name:
+        try:
+            # Registered with the resource tracker, which unlink() unregisters it from
+            segment = shared_memory.SharedMemory(name)
+        except FileNotFoundError:
+            return
+        segment.close()
+        segment.unlink()
+        _created_here.discard(segment._name)
+
+
+class SharedConfigPublisher:
+    """ Publishes versions of a configuration into shared memory, under the control segment called name.
+
+        Each version is written to a new data segment (the previous one is removed once the control segment points to
+        the new one; processes that still have it open can keep reading it). Call close() to remove the segments.
+    """
+
+    def __init__(self, name: str):
+        if len(name.lstrip("/").encode("utf-8")) > _MAX_NAME_LENGTH:
+            raise ValueError(f"Shared memory name {name} is longer than {_MAX_NAME_LENGTH} bytes")
+        self.name = name
+        try:
+            self.control = shared_memory.SharedMemory(name, create=True, size=_CONTROL.size)
+            _created_here.add(self.control._name)
+            generation = 0
+        except FileExistsError:
+            # Left behind by a previous publisher, continue its generations so readers notice the change
+            self.control = shared_memory.SharedMemory(name)
+            magic, _, generation, segment_name = _CONTROL.unpack_from(self.control.buf, 0)
+            if magic != _CONTROL_MAGIC:
+                generation = 0
+            else:
+                _remove_segment(segment_name.rstrip(b"\0").decode("utf-8"))
+        self.generation = generation
+        self._sequence = 0
+        self._segment = None
+        self._write_control(generation, b"")
+
+    def _write_control(self, generation: int, segment_name: bytes):
+        buf = self.control.buf
+        self._sequence += 1
+        _CONTROL.pack_into(buf, 0, _CONTROL_MAGIC, self._sequence, self.generation, segment_name)
+        self.generation = generation
+        self._sequence += 1
+        _CONTROL.pack_into(buf, 0, _CONTROL_MAGIC, self._sequence, generation, segment_name)
+
+    def publish(self, root) -> int:
+        """ Publish a new version of the configuration, returning its generation """
+        data = encode_tree(root)
+        generation = self.generation + 1
+        segment = shared_memory.SharedMemory(f"{self.name}.{generation}", create=True, size=len(data))
+        _created_here.add(segment._name)
+        segment.buf[:len(data)] = data
+        previous = self._segment
+        self._segment = segment
+        self._write_control(generation, segment.name.lstrip("/").encode("utf-8"))
+        if previous is not None:
+            previous.close()
+            previous.unlink()
+            _created_here.discard(previous._name)
+        return generation
+
+    def close(self):
+        """ Remove the segments """
+        for segment in (self._segment, self.control):
+            if segment is not None:
+                segment.close()
+                try:
+                    segment.unlink()
+                except FileNotFoundError:
+                    pass
+                _created_here.discard(segment._name)
+        self._segment = None
+        self.control = None
+
+
+class SharedConfigReader:
+    """ Reads the configuration published under name by a SharedConfigPublisher in another process """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.control = attach_segment(name)
+        self.generation = 0
+
+    def _read_control(self) -> t.Tuple[int, str]:
+        # The sequence number changes while the publisher writes, so read until the same one is seen before and after
+        while True:
+            magic, sequence, generation, segment_name = _CONTROL.unpack_from(self.control.buf, 0)
+            if magic != _CONTROL_MAGIC:
+                raise ValueError(f"{self.name} is not a zirconium shared memory segment")
+            if sequence % 2 == 0 and _CONTROL.unpack_from(self.control.buf, 0)[1] == sequence:
+                return generation, segment_name.rstrip(b"\0").decode("utf-8")
+            time.sleep(0)
+
+    def changed(self) -> bool:
+        """ Check if a newer version was published, without opening it """
+        return self._read_control()[0] != self.generation
+
+    def refresh(self, force: bool = False) -> t.Optional[SharedMapping]:
+        """ Open the latest version if it is newer than the last one opened (or if force is set), returning its root.
+            Returns None if there is no newer version. """
+        for attempt in range(_REFRESH_ATTEMPTS):
+            generation, segment_name = self._read_control()
+            if not segment_name or (generation == self.generation and not force):
+                return None
+            try:
+                segment = attach_segment(segment_name)
+            except FileNotFoundError:
+                # Replaced by a newer version in the meantime, or removed by a publisher that stopped
+                time.sleep(0.001 * 2 ** attempt)
+                continue
+            self.generation = generation
+            magic, root_offset, _ = _DATA_HEADER.unpack_from(segment.buf, 0)
+            if magic != _DATA_MAGIC:
+                raise ValueError(f"{segment_name} is not a zirconium shared memory segment")
+            return SharedMapping(segment.buf, root_offset, segment)
+        raise FileNotFoundError(f"Shared memory segment {segment_name} of {self.name} not found")
+
+    def close(self):
+        self.control.close()
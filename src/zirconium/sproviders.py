@@ -1,4 +1,7 @@
 import logging
+import threading
+import time
+import typing as t
 from urllib.parse import urlparse
 try:
     from azure.identity import DefaultAzureCredential
@@ -8,6 +11,70 @@ try:
 except ImportError:
     AZURE_ENABLED = False
 
+from .utils import LRUCache
+
+
+class SecretCache:
+    """ Size-bounded cache of secret values, which expire ttl seconds after they were fetched. Thread-safe.
+
+        Values of None (secrets that could not be found) are cached as well, so that a missing secret does not cause
+        a request each time it is used.
+    """
+
+    def __init__(self, ttl: float = 300, max_size: int = 1024, clock: t.Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = LRUCache(max_size)
+
+    def get(self, provider: str, secret_path: str, default=None):
+        entry = self._entries.get((provider, secret_path))
+        if entry is not None and entry[0] > self.clock():
+            self._entries.hits += 1
+            return entry[1]
+        self._entries.misses += 1
+        return default
+
+    def put(self, provider: str, secret_path: str, value):
+        if self.ttl > 0 and self._entries.max_size > 0:
+            self._entries.put((provider, secret_path), (self.clock() + self.ttl, value))
+
+    def __contains__(self, key: t.Tuple[str, str]) -> bool:
+        """ Check if a (provider, secret_path) has a value that has not expired, without counting a hit or a miss """
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] > self.clock()
+
+    def invalidate(self, provider: str, secret_path: str):
+        self._entries.discard((provider, secret_path))
+
+    def resize(self, max_size: int):
+        self._entries.resize(max_size)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return self._entries.stats()
+
+
+# Clients are expensive to create (the credential chain is evaluated on first use), so one is kept for each vault
+_azure_credential = None
+_azure_clients = {}
+_azure_lock = threading.Lock()
+
+
+def _azure_client(key_vault: str):
+    global _azure_credential
+    client = _azure_clients.get(key_vault)
+    if client is None:
+        with _azure_lock:
+            client = _azure_clients.get(key_vault)
+            if client is None:
+                if _azure_credential is None:
+                    _azure_credential = DefaultAzureCredential()
+                client = SecretClient(vault_url=key_vault, credential=_azure_credential)
+                _azure_clients[key_vault] = client
+    return client
+
 
 def azure_key_vault(secret_path):
     # Expects https://KEY_VAULT.vault.azure.net/SECRET_NAME
@@ -22,9 +89,8 @@ def azure_key_vault(secret_path):
     secret_name = parts.path
     if secret_name.startswith("/"):
         secret_name = secret_name[1:]
-    credentials = DefaultAzureCredential()
-    client = SecretClient(vault_url=key_vault, credential=credentials)
+    client = _azure_client(key_vault)
     try:
-        return client.get_secret(secret_name)
+        return client.get_secret(secret_name).value
     except HttpResponseError as ex:
         return None
@@ -0,0 +1,225 @@
+import collections.abc
+import contextlib
+import os
+import threading
+import time
+import typing as t
+import weakref
+
+
+class LoadPhase(t.NamedTuple):
+    """ One timed step of a load """
+    phase: str
+    # File, callback or other thing the step was about (None for steps about the whole configuration)
+    source: t.Optional[str]
+    # Seconds since the start of the load
+    started: float
+    duration: float
+    # Size of the file in bytes, for the read phase
+    size: t.Optional[int] = None
+    # True if the content from the last load was used instead of reading the file again
+    reused: bool = False
+
+
+class LoadStats:
+    """ Timings of one call to init() or reload_config(), by phase and by source.
+
+        The phases are "start" (copying the defaults and finding the files), "read" and "merge" (once per file),
+        "secrets" (fetching them), "environment" (applying environment variables), "publish" (applying secrets,
+        building the index and publishing the new configuration) and "callback" (once per on_load() callback, and once
+        for all the on_change() subscribers). When files are read concurrently or asynchronously, the read phases
+        overlap each other and the secrets phase.
+    """
+
+    def __init__(self, clock: t.Callable[[], float] = time.perf_counter):
+        self.clock = clock
+        # Wall-clock time at which the load started, to place the phases on a timeline
+        self.started_at = time.time()
+        self.duration = None
+        self.phases: t.List[LoadPhase] = []
+        self._start = clock()
+
+    @contextlib.contextmanager
+    def phase(self, phase: str, source: t.Optional[str] = None):
+        """ Time the block as a phase of the load. Yields a dict in which "size" and "reused" can be set. """
+        details = {}
+        start = self.clock()
+        try:
+            yield details
+        finally:
+            # list.append() is atomic, so files read in other threads can record their phases too
+            self.phases.append(LoadPhase(
+                phase,
+                source,
+                start - self._start,
+                self.clock() - start,
+                details.get("size"),
+                details.get("reused", False)
+            ))
+
+    def finish(self):
+        self.duration = self.clock() - self._start
+
+    def totals(self) -> t.Dict[str, float]:
+        """ Total seconds spent in each phase """
+        totals = {}
+        for entry in self.phases:
+            totals[entry.phase] = totals.get(entry.phase, 0) + entry.duration
+        return totals
+
+    def sources(self) -> t.Dict[str, dict]:
+        """ Time spent reading and merging each file, with its size in bytes and whether it was reused """
+        sources = {}
+        for entry in self.phases:
+            if entry.phase in ("read", "merge"):
+                info = sources.setdefault(entry.source, {"read": 0, "merge": 0, "size": None, "reused": False})
+                info[entry.phase] += entry.duration
+                if entry.phase == "read":
+                    info["size"] = entry.size
+                    info["reused"] = entry.reused
+        return sources
+
+    @property
+    def bytes_read(self) -> int:
+        """ Bytes in the files that were read, not counting those reused from the last load """
+        return sum(entry.size or 0 for entry in self.phases if entry.phase == "read" and not entry.reused)
+
+    def as_dict(self) -> dict:
+        """ Plain version of the statistics, e.g. to log them as JSON """
+        return {
+            "started_at": self.started_at,
+            "duration": self.duration,
+            "bytes_read": self.bytes_read,
+            "totals": self.totals(),
+            "phases": [entry._asdict() for entry in self.phases],
+        }
+
+
+def file_size(path) -> t.Optional[int]:
+    try:
+        return os.stat(path).st_size
+    except (OSError, TypeError, ValueError):
+        return None
+
+
+class AccessStats:
+    """ Number of reads of each key, and the methods used to read it.
+
+        Each thread counts into its own dictionary (so recording a read takes no lock), and the counts are only merged
+        when a report is made, or when the thread ends. With sample_every=N, only every Nth read in each thread is counted and the counts are
+        scaled up by N, which keeps the cost low enough for production use.
+    """
+
+    def __init__(self, sample_every: int = 1):
+        self.sample_every = max(1, int(sample_every))
+        self._local = threading.local()
+        # Counts of the running threads, by id() of the dictionary
+        self._thread_counts = {}
+        # Counts of the threads that ended
+        self._finished = {}
+        self._lock = threading.Lock()
+
+    def _thread_state(self) -> list:
+        # [counts, reads left before the next one is counted]
+        counts = {}
+        state = _ThreadState((counts, 1))
+        self._local.state = state
+        with self._lock:
+            self._thread_counts[id(counts)] = counts
+        # The state is dropped with the thread's locals when it ends
+        weakref.finalize(state, _fold_counts, weakref.ref(self), counts)
+        return state
+
+    def record(self, key, method: str):
+        """ Count a read of key (as given to the method, normalized when reporting) with the given method """
+        try:
+            state = self._local.state
+        except AttributeError:
+            state = self._thread_state()
+        if state[1] > 1:
+            state[1] -= 1
+            return
+        state[1] = self.sample_every
+        counts = state[0]
+        entry = (key, method)
+        try:
+            counts[entry] = counts.get(entry, 0) + 1
+        except TypeError:
+            # Keys given as lists
+            entry = (_hashable(key), method)
+            counts[entry] = counts.get(entry, 0) + 1
+
+    def counts(self, normalize: t.Callable = tuple) -> t.Dict[tuple, t.Dict[str, int]]:
+        """ Merge the counts of every thread, as {key tuple: {method: estimated reads}} """
+        with self._lock:
+            thread_counts = list(self._thread_counts.values())
+            thread_counts.append(self._finished.copy())
+        merged = {}
+        for counts in thread_counts:
+            # Copied first since the thread may be adding to it
+            for (key, method), count in list(counts.items()):
+                methods = merged.setdefault(normalize(key), {})
+                methods[method] = methods.get(method, 0) + count * self.sample_every
+        return merged
+
+    def clear(self):
+        with self._lock:
+            for counts in self._thread_counts.values():
+                counts.clear()
+            self._finished.clear()
+
+    def report(self, root: dict, normalize: t.Callable = tuple, top: int = 20) -> dict:
+        """ Summarize the reads of the configuration in root.
+
+            :returns: A dictionary with the estimated number of reads ("reads"), the most read keys and their counts
+                ("hot"), the methods used for each key and how often ("methods"), and the keys of the values that were
+                never read, neither directly nor by reading one of the sections containing them ("never_read").
+        """
+        counts = self.counts(normalize)
+        totals = {key: sum(methods.values()) for key, methods in counts.items()}
+        return {
+            "sample_every": self.sample_every,
+            "reads": sum(totals.values()),
+            "hot": sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top],
+            "methods": counts,
+            "never_read": [path for path in _leaf_paths(root) if not any(path[:i] in counts for i in range(1, len(path) + 1))],
+        }
+
+
+class _ThreadState(list):
+    # A list that can be referenced weakly
+    __slots__ = ("__weakref__",)
+
+
+def _fold_counts(stats_ref, counts: dict):
+    """ Add the counts of a thread that ended to the totals """
+    stats = stats_ref()
+    if stats is None:
+        return
+    with stats._lock:
+        stats._thread_counts.pop(id(counts), None)
+        finished = stats._finished
+        for entry, count in counts.items():
+            finished[entry] = finished.get(entry, 0) + count
+
+
+def _hashable(key):
+    if isinstance(key, (list, tuple)):
+        return tuple(_hashable(k) for k in key)
+    return key
+
+
+def _leaf_paths(root: dict) -> t.List[tuple]:
+    """ Key tuples of every value in root that is not a dictionary (empty dictionaries are included) """
+    paths = []
+    stack = [((), root)]
+    while stack:
+        prefix, node = stack.pop()
+        for key, value in node.items():
+            path = prefix + (key,)
+            if isinstance(value, collections.abc.Mapping) and value:
+                stack.append((path, value))
+            else:
+                paths.append(path)
+    paths.sort(key=str)
+    return paths
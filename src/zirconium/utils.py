@@ -1,4 +1,8 @@
+import contextlib
 import threading
+import functools
+import collections
+import collections.abc
 from autoinject import injector
 import datetime
 import typing as t
@@ -34,6 +38,241 @@ BYTE_UNITS = {
 }
 
 
+EnvTemplate = t.Union[str, t.Tuple[t.Union[str, t.Tuple[str, str]], ...]]
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_env_template(value: str) -> EnvTemplate:
+    """ Compile a string containing ${VAR} references into a template.
+
+        The result is either a plain string (when the value contains no references once the escapes are applied) or a
+        tuple of segments, where each segment is either a literal string or a (name, default) tuple naming an
+        environment variable to substitute. Compiled templates are cached, so each distinct string is only scanned
+        once.
+    """
+    # Escape rule for $ is dollar signs that precede a bracket
+    # ${var}
+    # $${not_a_var}, equivalent to string ${not_a_var}
+    # $$${var}, equivalent to "${}".format(os.environ["var"])
+    # $$$${not_a var}, equivalent to string $${not_a_var}
+    #
+    # ${{\}} equivalent to os.environ["{}"]
+    # ${{\\\}} equivalent to os.environ["{\}"]
+    state = "buffering"
+    ref_buffer = []
+    literal = []
+    segments = []
+    for c in value:
+        if c == "$":
+            if state == "buffering":
+                state = "opening_ref"
+                continue
+            elif state == "opening_ref":
+                literal.append("$")
+                state = "buffering"
+                continue
+        elif c == "{":
+            if state == "opening_ref":
+                state = "in_ref"
+                continue
+        elif c == "\\":
+            if state == "in_ref":
+                state = "escaping_in_ref"
+                continue
+            elif state == "escaping_in_ref":
+                ref_buffer.append("\\")
+                state = "in_ref"
+                continue
+        elif c == "}":
+            if state == "escaping_in_ref":
+                ref_buffer.append("}")
+                state = "in_ref"
+                continue
+            elif state == "in_ref":
+                if literal:
+                    segments.append("".join(literal))
+                    literal = []
+                segments.append(_split_env_reference("".join(ref_buffer)))
+                ref_buffer = []
+                state = "buffering"
+                continue
+        if state == "buffering":
+            literal.append(c)
+        elif state == "in_ref":
+            ref_buffer.append(c)
+        elif state == "escaping_in_ref":
+            ref_buffer.append("\\")
+            ref_buffer.append(c)
+            state = "in_ref"
+    if ref_buffer:
+        literal.append("${")
+        literal.extend(ref_buffer)
+    if literal:
+        segments.append("".join(literal))
+    if not segments:
+        return ""
+    if len(segments) == 1 and isinstance(segments[0], str):
+        return segments[0]
+    return tuple(segments)
+
+
+def _split_env_reference(name: str) -> t.Tuple[str, str]:
+    """ Split NAME=DEFAULT into its two parts (the default is blank if not specified) """
+    if "=" in name:
+        return name[0:name.find("=")], name[name.find("=") + 1:]
+    return name, ""
+
+
+def copy_tree(d):
+    """ Copy the dictionaries and lists of a configuration tree, sharing the other values """
+    if isinstance(d, MutableDeepDict):
+        d = d.d
+    if _is_mapping(d):
+        return {k: copy_tree(v) for k, v in d.items()}
+    if isinstance(d, list):
+        return [copy_tree(v) for v in d]
+    return d
+
+
+def diff_trees(old, new) -> t.List[tuple]:
+    """ Find the key paths at which two configuration trees differ.
+
+        Dictionaries (and other mappings) are compared key by key, any other value (including lists) is compared as a
+        whole, including the types of what it contains (see _same_value()). Subtrees that are the same object in both
+        trees are skipped without being compared.
+    """
+    changed = []
+    stack = [((), old, new)]
+    while stack:
+        path, a, b = stack.pop()
+        if a is b:
+            continue
+        if _is_mapping(a) and _is_mapping(b):
+            for k, v in a.items():
+                if k in b:
+                    stack.append((path + (k,), v, b[k]))
+                else:
+                    changed.append(path + (k,))
+            changed.extend(path + (k,) for k in b if k not in a)
+        elif not _same_value(a, b):
+            changed.append(path)
+    return changed
+
+
+def _is_mapping(value) -> bool:
+    cls = type(value)
+    return cls is dict or (cls not in _SCALAR_TYPES and isinstance(value, collections.abc.Mapping))
+
+
+def share_subtrees(old, new):
+    """ Make a new version of a configuration tree share everything that did not change with the old version.
+
+        Returns new, except that each subtree (or value) equal to the one at the same path in old is replaced by the
+        one from old. Dictionaries of new that contain such subtrees are copied rather than modified, and a tree equal
+        to old is returned as old itself. Later diffs between the two versions skip the shared subtrees by identity,
+        and keeping both versions costs no more memory than what changed.
+    """
+    if type(old) is not dict or type(new) is not dict:
+        return old if _same_value(old, new) else new
+    # Frames of [old dict, new dict, remaining items of new, children to replace, all children shared, key in parent]
+    stack = [[old, new, iter(new.items()), {}, len(old) == len(new), None]]
+    while True:
+        frame = stack[-1]
+        old_node, items, replaced = frame[0], frame[2], frame[3]
+        descended = False
+        for k, v in items:
+            old_value = old_node.get(k, _MISSING)
+            if old_value is v:
+                continue
+            if type(old_value) is dict and type(v) is dict:
+                stack.append([old_value, v, iter(v.items()), {}, len(old_value) == len(v), k])
+                descended = True
+                break
+            if old_value is not _MISSING and _same_value(old_value, v):
+                replaced[k] = old_value
+            else:
+                frame[4] = False
+        if descended:
+            continue
+        stack.pop()
+        if frame[4]:
+            result = old_node
+        elif replaced:
+            result = {**frame[1], **replaced}
+        else:
+            result = frame[1]
+        if not stack:
+            return result
+        parent, key = stack[-1], frame[5]
+        if result is parent[0][key]:
+            parent[3][key] = result
+        else:
+            parent[4] = False
+            if result is not frame[1]:
+                parent[3][key] = result
+
+
+def _same_value(a, b) -> bool:
+    """ Check if two values are the same data, not only equal: 1 and True, [1] and [True], 0.0 and -0.0 or the same
+        instant in different timezones are not """
+    stack = [(a, b)]
+    try:
+        while stack:
+            a, b = stack.pop()
+            if a is b:
+                continue
+            cls = type(a)
+            if cls is not type(b):
+                return False
+            if cls is list or cls is tuple:
+                if len(a) != len(b):
+                    return False
+                stack.extend(zip(a, b))
+            elif cls is dict:
+                if a.keys() != b.keys():
+                    return False
+                stack.extend((a[k], b[k]) for k in a)
+            elif cls is set or cls is frozenset:
+                if {(type(x), x) for x in a} != {(type(x), x) for x in b}:
+                    return False
+            elif cls in _EXACT_TYPES:
+                if a != b:
+                    return False
+            elif not (a == b and repr(a) == repr(b)):
+                # The representations differ for e.g. timezones, Decimal precision and the sign of zero
+                return False
+        return True
+    except Exception:
+        return False
+
+
+def tree_value(root, path: tuple, default=None):
+    """ Retrieve the value at a full key tuple from a configuration tree, or default if it doesn't exist """
+    node = root
+    try:
+        for k in path:
+            node = node[k]
+    except (KeyError, IndexError, TypeError):
+        return default
+    return node
+
+
+def run_awaitable(awaitable):
+    """ Wait for an awaitable from synchronous code (using another thread if an event loop is running in this one) """
+    import asyncio
+
+    async def _wait():
+        return await awaitable
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(_wait())
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, _wait()).result()
+
+
 def parse_for_units(val: str, max_unit_len: int, default_units: str) -> t.Tuple[t.Union[int, float], str]:
     val = val.strip()
     if max_unit_len < 0:
@@ -76,6 +315,50 @@ def convert_to_timedelta(val: t.Union[float, int], units: str) -> datetime.timed
         raise ValueError(f"Unknown units for timedelta: {units}")
 
 
+def coerce_bytes(val, default_units: str = "b", allow_metric: bool = False) -> t.Union[int, float]:
+    """ Convert a number or a string like "2 MiB" to a number of bytes """
+    if isinstance(val, int) or isinstance(val, float):
+        return convert_to_bytes(val, default_units, not allow_metric)
+    val, units = parse_for_units(str(val), 3, default_units)
+    return convert_to_bytes(val, units, not allow_metric)
+
+
+def coerce_timedelta(val, default_units: str = "s") -> datetime.timedelta:
+    """ Convert a number or a string like "5m" to a timedelta """
+    if isinstance(val, datetime.timedelta):
+        return val
+    elif isinstance(val, int) or isinstance(val, float):
+        return convert_to_timedelta(val, default_units)
+    val, units = parse_for_units(str(val), 2, default_units)
+    return convert_to_timedelta(val, units)
+
+
+def coerce_date(dt) -> datetime.date:
+    """ Convert a date, datetime or ISO format string to a date """
+    if isinstance(dt, datetime.datetime):
+        return datetime.date(dt.year, dt.month, dt.day)
+    elif isinstance(dt, datetime.date):
+        return dt
+    try:
+        return datetime.date.fromisoformat(dt)
+    except ValueError:
+        dt = datetime.datetime.fromisoformat(dt)
+        return datetime.date(dt.year, dt.month, dt.day)
+
+
+def coerce_datetime(dt, tzinfo=None) -> datetime.datetime:
+    """ Convert a date, datetime or ISO format string to a datetime, using tzinfo if it has no timezone """
+    if isinstance(dt, datetime.datetime):
+        pass
+    elif isinstance(dt, datetime.date):
+        return datetime.datetime(dt.year, dt.month, dt.day, 0, 0, 0, tzinfo=tzinfo)
+    else:
+        dt = datetime.datetime.fromisoformat(dt)
+    if dt.tzinfo is None and tzinfo is not None:
+        return datetime.datetime(dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second, dt.microsecond, tzinfo)
+    return dt
+
+
 @injector.inject
 def print_config(obfuscate_keys=None, cfg: "zirconium.config.ApplicationConfig" = None):
     print("----- Loaded Files -----")
@@ -94,7 +377,7 @@ def _print_dict(d, prefix='  ', level=0, parent_prefix=None, obfuscate_keys=None
         if obfuscate_keys is not None and full_path in obfuscate_keys:
             print(f"{prefix * level}{key}: {'*' * len(val)}")
             continue
-        if isinstance(val, dict):
+        if _is_mapping(val):
             print(f"{prefix * level}{key}: ")
             _print_dict(val, prefix, level + 1, full_path, obfuscate_keys)
         elif isinstance(val, set) or isinstance(val, list) or isinstance(val, tuple):
@@ -140,31 +423,350 @@ def _config_decorator(func, ach: _AppConfigHooks = None):
     return func
 
 
+_MISSING = object()
+# Paths that are not in the changes of a PathIndex
+_UNCHANGED = object()
+
+# Types whose equal values are the same data
+_EXACT_TYPES = frozenset((str, int, bool, bytes, type(None)))
+# Types of the values found in parsed files which are never dict-like, so they can be ruled out without hasattr()
+_SCALAR_TYPES = frozenset((str, int, float, bool, list, tuple, bytes, type(None), datetime.date, datetime.datetime))
+
+
+class PathIndex(collections.abc.Mapping):
+    """ Flat path index that can be copied cheaply, for copy-on-write trees.
+
+        The entries are a base dictionary, which is shared between copies and never modified, and the changes made on
+        top of it (with _MISSING for removed paths). Copying only copies the changes, and once these grow past the
+        square root of the size of the base they are merged into a new base, so a write costs O(sqrt(n)) instead of
+        copying all n entries.
+    """
+
+    __slots__ = ("base", "changes")
+
+    def __init__(self, base: dict, changes: dict = None):
+        self.base = base
+        self.changes = {} if changes is None else changes
+
+    def copy(self) -> "PathIndex":
+        if len(self.changes) ** 2 > len(self.base):
+            base = self.base.copy()
+            for path, value in self.changes.items():
+                if value is _MISSING:
+                    base.pop(path, None)
+                else:
+                    base[path] = value
+            return PathIndex(base)
+        return PathIndex(self.base, self.changes.copy())
+
+    def get(self, path, default=None):
+        value = self.changes.get(path, _UNCHANGED)
+        if value is _UNCHANGED:
+            return self.base.get(path, default)
+        return default if value is _MISSING else value
+
+    def __getitem__(self, path):
+        value = self.get(path, _MISSING)
+        if value is _MISSING:
+            raise KeyError(path)
+        return value
+
+    def __contains__(self, path):
+        return self.get(path, _MISSING) is not _MISSING
+
+    def __setitem__(self, path, value):
+        self.changes[path] = value
+
+    def pop(self, path, default=None):
+        value = self.get(path, _MISSING)
+        if value is _MISSING:
+            return default
+        self.changes[path] = _MISSING
+        return value
+
+    def __iter__(self):
+        changes = self.changes
+        for path in self.base:
+            if path not in changes:
+                yield path
+        for path, value in changes.items():
+            if value is not _MISSING:
+                yield path
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+def copy_index(index):
+    """ Copy a flat path index for a copy-on-write write """
+    if index is None:
+        return None
+    if isinstance(index, PathIndex):
+        return index.copy()
+    # A new index was built, which will be shared with the previous version from now on
+    return PathIndex(index)
+
+
+class LoadLock:
+    """ Lock held for the whole of a load, by a thread (init() and reload_config()) or by an asyncio task (ainit() and
+        areload(), whose steps run in several threads). The owner can acquire it again while holding it, and it is not
+        bound to an event loop. """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._owner = None
+        self._count = 0
+
+    def acquire(self, owner, blocking: bool = True) -> bool:
+        with self._condition:
+            while self._owner is not None and self._owner != owner:
+                if not blocking:
+                    return False
+                self._condition.wait()
+            self._owner = owner
+            self._count += 1
+            return True
+
+    def release(self):
+        with self._condition:
+            self._count -= 1
+            if self._count == 0:
+                self._owner = None
+                self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def held_by_thread(self):
+        """ Hold the lock in the current thread """
+        owner = ("thread", threading.get_ident())
+        if not self.acquire(owner, blocking=False):
+            if self._owner is not None and self._owner[0] is _running_loop():
+                # Waiting would block the event loop that the holder needs to finish
+                raise RuntimeError("The configuration is being loaded by a coroutine on this event loop, await ainit() instead")
+            self.acquire(owner)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @contextlib.asynccontextmanager
+    async def held_by_task(self):
+        """ Hold the lock in the current asyncio task, waiting for it without blocking the event loop """
+        import asyncio
+        owner = (asyncio.get_running_loop(), asyncio.current_task())
+        delay = 0.001
+        while not self.acquire(owner, blocking=False):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.05)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+def _running_loop():
+    """ The event loop running in this thread, if any """
+    import asyncio
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class LRUCache:
+    """ Size-bounded mapping that evicts the least recently used entry. Thread-safe.
+
+        The hit and miss counters are maintained by the callers, since only they know whether an entry they found is
+        still valid.
+    """
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """ Retrieve an entry and mark it as recently used """
+        value = self._data.get(key, default)
+        if value is not default:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                # Evicted by another thread in the meantime
+                pass
+        return value
+
+    def put(self, key, value):
+        """ Store an entry, evicting the oldest ones if the cache is full """
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def discard(self, key):
+        """ Remove an entry if it exists """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def resize(self, max_size: int):
+        """ Change the maximum size, evicting entries as needed """
+        with self._lock:
+            self.max_size = max_size
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """ Remove all entries and reset the counters """
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """ Summary of the cache usage """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._data),
+            "max_size": self.max_size,
+        }
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+
 class MutableDeepDict:
     """ Deep dictionary class that supports tuple-like access to deep properties """
 
-    def __init__(self, base_dict=None):
-        """ Constructor """
+    def __init__(self, base_dict=None, indexed=False, copy_on_write=False):
+        """ Constructor
+
+            :param indexed: Build a flat index of every key path (see build_index())
+            :param copy_on_write: Never modify the nested dictionaries in place. Writes copy the dictionaries on the
+                path to the key being changed and then replace the root, so a reference to the root is never affected
+                by later writes.
+        """
+        self.copy_on_write = copy_on_write
         self.d = base_dict if base_dict else {}
         self.lock = threading.RLock()
+        self._index = None
+        if indexed:
+            self.build_index()
+
+    def build_index(self):
+        """ Build a flat index from every full key tuple to its value (leaf or sub-dictionary) so that deep lookups
+            cost a single hash lookup. The index is kept in sync by writes made through this object, but not by
+            changes made directly to the nested dictionaries. """
+        index = {}
+        MutableDeepDict._index_subtree(index, (), self.d)
+        self._index = index
+
+    def drop_index(self):
+        """ Remove the flat index """
+        self._index = None
+
+    @staticmethod
+    def _index_subtree(index, prefix, node):
+        """ Add the paths of every entry below node to index """
+        stack = [(prefix, node)]
+        while stack:
+            prefix, node = stack.pop()
+            for k in node.keys():
+                path = prefix + (k,)
+                val = node[k]
+                index[path] = val
+                if MutableDeepDict.is_dict_like(val):
+                    stack.append((path, val))
 
-    def _navigate_to_item(self, key, create=False):
+    @staticmethod
+    def _unindex_subtree(index, prefix, node):
+        """ Remove the paths of every entry below node from index """
+        stack = [(prefix, node)]
+        while stack:
+            prefix, node = stack.pop()
+            for k in node.keys():
+                path = prefix + (k,)
+                index.pop(path, None)
+                val = node[k]
+                if MutableDeepDict.is_dict_like(val):
+                    stack.append((path, val))
+
+    @staticmethod
+    def _reindex(index, root, path, old_value, new_value):
+        """ Replace the index entries for path after it changed from old_value to new_value """
+        if MutableDeepDict.is_dict_like(old_value):
+            MutableDeepDict._unindex_subtree(index, path, old_value)
+        if new_value is _MISSING:
+            index.pop(path, None)
+            return
+        # Intermediate dictionaries may have been created or copied
+        node = root
+        for i in range(0, len(path) - 1):
+            node = node[path[i]]
+            index[path[:i + 1]] = node
+        index[path] = new_value
+        if MutableDeepDict.is_dict_like(new_value):
+            MutableDeepDict._index_subtree(index, path, new_value)
+
+    @staticmethod
+    def _path(key) -> tuple:
+        """ Convert a key given to __setitem__() and similar methods into a full key tuple """
+        if isinstance(key, str):
+            return key,
+        try:
+            return tuple(key)
+        except TypeError:
+            return key,
+
+    @staticmethod
+    def _shallow_copy(node) -> dict:
+        """ Copy a dict-like node into a new dictionary """
+        if isinstance(node, MutableDeepDict):
+            node = node.d
+        if isinstance(node, dict):
+            return node.copy()
+        return {k: node[k] for k in node.keys()}
+
+    def _writable(self):
+        """ Get the root and index that a write should modify, which are copies if copy_on_write is set """
+        if self.copy_on_write:
+            return MutableDeepDict._shallow_copy(self.d), copy_index(self._index)
+        return self.d, self._index
+
+    def _publish(self, root, index):
+        """ Make the result of a write visible """
+        self._index = index
+        self.d = root
+
+    def _navigate_to_item(self, key, create=False, root=None):
         """ Navigate to an item in the tree structure specified by key
 
             :param key: The key to navigate to
             :type key: str or tuple
             :param create: If set to true, the entry will be created
             :type create: bool
+            :param root: The dictionary to start from, if not the root of this one. When copy_on_write is set and a
+                root is given, the dictionaries along the way are copied so that they can be modified.
             :returns: A tuple, with the first item being the dictionary structure and the second being the key in that
                 structure that represents the tail element of key. Both will be None if a parent key does not exist
             :rtype: tuple(dict, str)
         """
+        copy = root is not None and self.copy_on_write
+        if root is None:
+            root = self.d
         try:
             if isinstance(key, str):
-                return self.d, key
-            parent = self.d
+                return root, key
+            parent = root
             for k in key[:-1]:
                 if k in parent and MutableDeepDict.is_dict_like(parent[k]):
+                    if copy:
+                        parent[k] = MutableDeepDict._shallow_copy(parent[k])
                     parent = parent[k]
                 elif create:
                     parent[k] = {}
@@ -173,13 +775,19 @@ class MutableDeepDict:
                     return None, None
             return parent, key[-1]
         except TypeError:
-            return self.d, key
+            return root, key
 
     def __setitem__(self, key, value):
         """ Thread-safe __setitem__ implementation """
         with self.lock:
-            parent, k = self._navigate_to_item(key, True)
+            root, index = self._writable()
+            parent, k = self._navigate_to_item(key, True, root)
+            old_value = parent.get(k, _MISSING) if index is not None else None
             parent[k] = value
+            if index is not None:
+                MutableDeepDict._reindex(index, root, MutableDeepDict._path(key), old_value, value)
+            self._publish(root, index)
+            self._mutated()
 
     def __getitem__(self, key):
         """ __getitem__ implementation"""
@@ -188,12 +796,24 @@ class MutableDeepDict:
     def __delitem__(self, key):
         """ Thread-safe __delitem__ implementation"""
         with self.lock:
-            parent, k = self._navigate_to_item(key)
+            root, index = self._writable()
+            parent, k = self._navigate_to_item(key, root=root)
             if parent:
+                old_value = parent[k]
                 del parent[k]
+                if index is not None:
+                    MutableDeepDict._reindex(index, root, MutableDeepDict._path(key), old_value, _MISSING)
+                self._publish(root, index)
+                self._mutated()
 
     def __contains__(self, key):
         """ __contains__ implementation """
+        index = self._index
+        if index is not None:
+            try:
+                return MutableDeepDict._path(key) in index
+            except TypeError:
+                return False
         parent, k = self._navigate_to_item(key)
         return parent is not None and k in parent
 
@@ -207,22 +827,61 @@ class MutableDeepDict:
 
     def clear(self):
         """Clear the dictionary of all entries."""
-        self.d = {}
+        with self.lock:
+            self._publish({}, {} if self._index is not None else None)
+            self._mutated()
 
     def deep_update(self, d):
-        """ Similar to update(), but will merge dictionaries at depth. Thread-safe. """
+        """ Similar to update(), but will merge dictionaries at depth. Thread-safe.
+
+            Values that are not merged are stored as they are, not copied. Nested dictionaries that are merged into
+            are modified in place, unless copy_on_write is set (or they are dict-like objects other than dictionaries),
+            in which case they are replaced by a merged copy.
+        """
+        is_dict_like = MutableDeepDict.is_dict_like
         with self.lock:
-            for key in d.keys():
-                if key in self.d and MutableDeepDict.is_dict_like(d[key]) and MutableDeepDict.is_dict_like(self.d[key]):
-                    mut = MutableDeepDict(self.d[key])
-                    mut.deep_update(d[key])
-                else:
-                    self.d[key] = d[key]
+            root, index = self._writable()
+            copy = self.copy_on_write
+            # Iterative, so that the depth of the tree is not limited by the recursion limit
+            stack = [((), root, d)]
+            while stack:
+                prefix, target, source = stack.pop()
+                if isinstance(source, MutableDeepDict):
+                    source = source.d
+                items = source.items() if isinstance(source, dict) else [(k, source[k]) for k in source.keys()]
+                for key, value in items:
+                    old_value = target.get(key, _MISSING)
+                    if old_value is not _MISSING and is_dict_like(value) and is_dict_like(old_value):
+                        if copy or not isinstance(old_value, dict):
+                            old_value = MutableDeepDict._shallow_copy(old_value)
+                            target[key] = old_value
+                            if index is not None:
+                                index[prefix + (key,)] = old_value
+                        stack.append((prefix + (key,), old_value, value))
+                        continue
+                    target[key] = value
+                    if index is not None:
+                        path = prefix + (key,)
+                        if old_value is not _MISSING and is_dict_like(old_value):
+                            MutableDeepDict._unindex_subtree(index, path, old_value)
+                        index[path] = value
+                        if is_dict_like(value):
+                            MutableDeepDict._index_subtree(index, path, value)
+            self._publish(root, index)
+            self._mutated()
 
     def update(self, d):
         """ Thread-safe implementation of dict.update() """
         with self.lock:
-            self.d.update(d)
+            root, index = self._writable()
+            if index is not None:
+                for key in d.keys():
+                    MutableDeepDict._reindex(index, root, (key,), root.get(key), d[key])
+                    root[key] = d[key]
+            else:
+                root.update(d)
+            self._publish(root, index)
+            self._mutated()
 
     def _expand_key(self, key):
         """ Given a key, expands it to an ordered list to be used with _navigate_to_item() or other methods that
@@ -239,6 +898,17 @@ class MutableDeepDict:
         """ Implementation of dict.get(). Added a raise_error parameter which causes ValueError to be raised if the
             key does not exist, otherwise the default is returned. """
         key = self._expand_key(key)
+        index = self._index
+        if index is not None:
+            try:
+                value = index.get(tuple(key), _MISSING)
+            except TypeError:
+                value = _MISSING
+            if value is not _MISSING:
+                return value
+            if raise_error:
+                raise ValueError("No such key: {}".format(".".join(key)))
+            return default
         parent, k = self._navigate_to_item(key)
         if ((parent is None) or (not k in parent)) and raise_error:
             raise ValueError("No such key: {}".format(".".join(key)))
@@ -258,18 +928,62 @@ class MutableDeepDict:
     def pop(self, key, default):
         """ Thread-safe implementation of dict.pop() that works on deep arrays. """
         with self.lock:
-            parent, k = self._navigate_to_item(key)
+            root, index = self._writable()
+            parent, k = self._navigate_to_item(key, root=root)
             if parent:
-                return parent.pop(key, default)
+                value = parent.pop(k, _MISSING)
+                if value is _MISSING:
+                    return default
+                if index is not None:
+                    MutableDeepDict._reindex(index, root, MutableDeepDict._path(key), value, _MISSING)
+                self._publish(root, index)
+                self._mutated()
+                return value
             return default
 
+    def find(self, pattern) -> dict:
+        """ Find all the entries matching a pattern, where * matches any key at that level.
+
+            :param pattern: Either a dot-separated string (e.g. "services.*.port") or a tuple of keys
+            :returns: A dictionary of full key tuples to their values
+        """
+        if isinstance(pattern, str):
+            pattern = pattern.split(".")
+        matches = [()]
+        for segment in pattern:
+            next_matches = []
+            for prefix in matches:
+                node = self._node_at(prefix)
+                if not MutableDeepDict.is_dict_like(node):
+                    continue
+                if segment == "*":
+                    next_matches.extend(prefix + (k,) for k in node.keys())
+                elif segment in node:
+                    next_matches.append(prefix + (segment,))
+            matches = next_matches
+        return {path: self._node_at(path) for path in matches}
+
+    def _node_at(self, path: tuple):
+        """ Retrieve the value at a full key tuple which is known to exist """
+        if not path:
+            return self.d
+        if self._index is not None:
+            return self._index[path]
+        node = self.d
+        for k in path:
+            node = node[k]
+        return node
+
+    def _mutated(self):
+        """ Called after every write to the dictionary, for subclasses that need to track changes """
+        pass
+
     @staticmethod
     def is_dict_like(d):
         """ Checks if d is dict-like """
-        if isinstance(d, dict):
+        cls = type(d)
+        if cls is dict:
             return True
-        if isinstance(d, MutableDeepDict):
-             return True
-        if hasattr(d, "keys"):
-            return True
-        return False
+        if cls in _SCALAR_TYPES:
+            return False
+        return isinstance(d, (dict, MutableDeepDict)) or hasattr(d, "keys")
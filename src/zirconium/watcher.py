@@ -0,0 +1,160 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import sys
+import threading
+import time
+import typing as t
+from pathlib import Path
+
+
+# inotify event flags, see inotify(7)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF |
+    IN_MOVE_SELF
+)
+
+
+class _Inotify:
+    """ Minimal inotify binding. Only used to wake up the watcher early, changes are confirmed with stat() """
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watched = set()
+
+    def watch(self, directory: str):
+        if directory in self._watched:
+            return
+        if self._add_watch(self.fd, os.fsencode(directory), WATCH_MASK) >= 0:
+            self._watched.add(directory)
+
+    def wait(self, timeout: float, wake_fd: int) -> bool:
+        """ Wait for events (or for wake_fd to be readable) and discard them, returns True if there were any """
+        readable, _, _ = select.select([self.fd, wake_fd], [], [], max(timeout, 0))
+        if self.fd not in readable:
+            return False
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+
+class ConfigWatcher:
+    """ Watches the files registered with an ApplicationConfig and reloads it when they change.
+
+        Files are checked with stat(), comparing the resolved path, inode, size and modification time, which also
+        detects editors that replace files by renaming and Kubernetes ConfigMap volumes that swap a symlink. On Linux,
+        inotify is used to notice changes as they happen, otherwise files are polled every poll_interval seconds.
+        Reloads only happen once no further changes have been seen for debounce seconds, and run on the watcher's
+        own thread.
+    """
+
+    def __init__(self, config, debounce: float = 0.5, poll_interval: float = 1.0, use_inotify: bool = True):
+        self.config = config
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.log = logging.getLogger("zirconium")
+        self._stop = threading.Event()
+        self._thread = None
+        self._inotify = None
+        if use_inotify and sys.platform.startswith("linux"):
+            try:
+                self._inotify = _Inotify()
+                self._wake_read, self._wake_write = os.pipe()
+            except (OSError, AttributeError) as ex:
+                self.log.debug(f"inotify not available, polling for changes instead: {ex}")
+
+    def watched_paths(self) -> t.List[Path]:
+        """ Paths of every registered file, including those named by environment variables """
+        paths = []
+        with self.config.registry_lock:
+            for key in ("defaults", "regulars"):
+                paths.extend(entry[0] for entry in self.config.file_registry[key])
+            for entry in self.config.file_registry["environment"]:
+                env_val = self.config.get_env_var(entry[0])
+                if env_val:
+                    paths.append(env_val)
+        return [Path(p).expanduser().absolute() for p in paths]
+
+    def _signatures(self) -> dict:
+        signatures = {}
+        for path in self.watched_paths():
+            if self._inotify is not None:
+                self._inotify.watch(str(path.parent))
+            try:
+                st = os.stat(path)
+                signatures[path] = (os.path.realpath(path), st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+            except OSError:
+                signatures[path] = None
+        return signatures
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        # Taken before returning so that changes made right after start() are noticed
+        initial = self._signatures()
+        self._thread = threading.Thread(target=self._run, args=(initial,), name="zirconium-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            if self._inotify is not None:
+                os.write(self._wake_write, b"\0")
+            self._thread.join()
+            self._thread = None
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+            os.close(self._wake_read)
+            os.close(self._wake_write)
+
+    def _wait(self, timeout: float):
+        if self._inotify is not None:
+            self._inotify.wait(timeout, self._wake_read)
+        else:
+            self._stop.wait(timeout)
+
+    def _run(self, last: dict):
+        reload_at = None
+        while not self._stop.is_set():
+            timeout = self.poll_interval
+            if reload_at is not None:
+                timeout = min(timeout, reload_at - time.monotonic())
+            self._wait(timeout)
+            if self._stop.is_set():
+                break
+            current = self._signatures()
+            if current != last:
+                last = current
+                # Wait for the burst of changes to finish
+                reload_at = time.monotonic() + self.debounce
+            if reload_at is not None and time.monotonic() >= reload_at:
+                reload_at = None
+                try:
+                    self.log.info("Configuration files changed, reloading")
+                    self.config.reload_config()
+                except Exception as ex:
+                    self.log.exception(f"Error reloading configuration: {ex}")
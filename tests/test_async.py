@@ -0,0 +1,184 @@
+import asyncio
+import json
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+import zirconium
+
+
+class AsyncJsonParser:
+
+    def __init__(self):
+        self.calls = 0
+
+    def handles(self, path: str):
+        return path.lower().endswith(".ajson")
+
+    async def aread_dict(self, path, encoding):
+        self.calls += 1
+        await asyncio.sleep(0)
+        return json.loads(Path(path).read_text(encoding=encoding))
+
+
+class SlowJsonParser(AsyncJsonParser):
+
+    def __init__(self):
+        super().__init__()
+        self.active = 0
+        self.most_active = 0
+        self._lock = threading.Lock()
+
+    async def aread_dict(self, path, encoding):
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            self.most_active = max(self.most_active, self.active)
+        try:
+            await asyncio.sleep(0.2)
+            return json.loads(Path(path).read_text(encoding=encoding))
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+class AsyncProvider:
+
+    def __init__(self, secrets, delay=0.0):
+        self.secrets = secrets
+        self.delay = delay
+
+    async def __call__(self, secret_path):
+        await asyncio.sleep(self.delay)
+        return self.secrets.get(secret_path)
+
+
+class TestAsyncConfig(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.json_file = self.directory / "one.json"
+        self.json_file.write_text('{"one": 1, "nested": {"a": 1}}')
+        self.async_file = self.directory / "two.ajson"
+        self.async_file.write_text('{"two": 2, "nested": {"b": 2}}')
+        self.parser = AsyncJsonParser()
+        self.config = zirconium.ApplicationConfig(True)
+        self.config.register_file(self.json_file)
+        self.config.register_file(self.async_file, parser=self.parser)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    async def test_ainit(self):
+        loaded = []
+
+        async def on_load(config):
+            await asyncio.sleep(0)
+            loaded.append(config["nested"])
+
+        self.config.on_load(on_load)
+        self.config.enable_load_stats()
+        await self.config.ainit()
+        self.assertEqual(self.config["one"], 1)
+        self.assertEqual(self.config["two"], 2)
+        self.assertEqual(loaded, [{"a": 1, "b": 2}])
+        self.assertCountEqual(self.config.load_stats.sources(), [str(self.json_file), str(self.async_file)])
+        self.assertEqual(self.config.load_stats.totals().keys(), {
+            "start", "read", "secrets", "merge", "environment", "publish", "callback"
+        })
+
+    async def test_areload(self):
+        await self.config.ainit()
+        await self.config.areload()
+        self.assertEqual(self.parser.calls, 1)
+        self.async_file.write_text('{"two": 22}')
+        await self.config.areload()
+        self.assertEqual(self.parser.calls, 2)
+        self.assertEqual(self.config["two"], 22)
+
+    async def test_async_secrets(self):
+        secrets = {f"secret{i}": str(i) for i in range(5)}
+        self.config.register_secret_provider("async", AsyncProvider(secrets, 0.2))
+        for name in secrets:
+            self.config.register_secret_config(name, "async", "secrets", name)
+        start = time.monotonic()
+        await self.config.ainit()
+        self.assertLess(time.monotonic() - start, 0.6)
+        self.assertEqual(self.config["secrets"], secrets)
+
+    async def test_timeout(self):
+        self.config.register_secret_provider("async", AsyncProvider({"slow": "1"}, 1))
+        self.config.set_secret_loading(timeout=0.1)
+        self.config.register_secret_config("slow", "async", "slow")
+        await self.config.ainit()
+        self.assertFalse("slow" in self.config)
+
+
+class TestSyncWithAsyncPlugins(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.path = self.directory / "config.ajson"
+        self.path.write_text('{"one": 1}')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_event_loops(self):
+        parser = SlowJsonParser()
+        config = zirconium.ApplicationConfig(True)
+        config.register_file(self.path, parser=parser)
+
+        async def reload_twice():
+            await asyncio.gather(config.areload(True), config.areload(True))
+
+        # The application config outlives each event loop
+        asyncio.run(reload_twice())
+        asyncio.run(reload_twice())
+        self.assertEqual(parser.calls, 4)
+        self.assertEqual(parser.most_active, 1)
+        self.assertEqual(config["one"], 1)
+
+    def test_sync_reload_during_ainit(self):
+        parser = SlowJsonParser()
+        config = zirconium.ApplicationConfig(True)
+        config.register_file(self.path, parser=parser)
+
+        async def load():
+            task = asyncio.ensure_future(config.ainit())
+            await asyncio.sleep(0.05)
+            reloading = threading.Thread(target=config.reload_config, args=(True,))
+            reloading.start()
+            await task
+            await asyncio.get_running_loop().run_in_executor(None, reloading.join)
+
+        asyncio.run(load())
+        self.assertEqual(parser.calls, 2)
+        self.assertEqual(parser.most_active, 1)
+
+    def test_sync_init_in_event_loop(self):
+        config = zirconium.ApplicationConfig(True)
+        config.register_file(self.path, parser=SlowJsonParser())
+
+        async def load():
+            task = asyncio.ensure_future(config.ainit())
+            await asyncio.sleep(0.05)
+            with self.assertRaises(RuntimeError):
+                config.reload_config()
+            await task
+
+        asyncio.run(load())
+        self.assertEqual(config["one"], 1)
+
+    def test_init(self):
+        config = zirconium.ApplicationConfig(True)
+        config.register_file(self.path, parser=AsyncJsonParser())
+        config.register_secret_provider("async", AsyncProvider({"secret": "value"}))
+        config.register_secret_config("secret", "async", "secret")
+        config.init()
+        self.assertEqual(config["one"], 1)
+        self.assertEqual(config["secret"], "value")
+        self.assertEqual(config.get_secret("secret", "async"), "value")
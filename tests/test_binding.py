@@ -0,0 +1,94 @@
+import dataclasses
+import datetime
+import os
+import typing as t
+import unittest
+from pathlib import Path
+
+import zirconium
+
+
+@dataclasses.dataclass(frozen=True)
+class PoolSettings:
+    size: int = 5
+    timeout: datetime.timedelta = datetime.timedelta(seconds=30)
+
+
+@dataclasses.dataclass(frozen=True)
+class DatabaseSettings:
+    host: str
+    port: int
+    buffer: t.Annotated[int, zirconium.coerce_bytes]
+    started: t.Optional[datetime.date] = None
+    replicas: list = dataclasses.field(default_factory=list)
+    data_dir: Path = dataclasses.field(default=Path("."), metadata={"config_key": "data-dir"})
+    pool: PoolSettings = PoolSettings()
+
+
+class Limits(t.NamedTuple):
+    requests: int
+    burst: float = 1.5
+
+
+class TestBinding(unittest.TestCase):
+
+    def setUp(self):
+        self.config = zirconium.ApplicationConfig(True)
+        self.config.set_defaults({
+            "database": {
+                "host": "${ZR_BINDING_HOST}",
+                "port": "5432",
+                "buffer": "2 KiB",
+                "started": "2020-01-02",
+                "data-dir": "/var/data",
+                "pool": {"timeout": "5m"},
+            },
+            "limits": {"requests": "10"},
+        })
+        os.environ["ZR_BINDING_HOST"] = "db.example.com"
+
+    def tearDown(self):
+        del os.environ["ZR_BINDING_HOST"]
+
+    def test_bind_dataclass(self):
+        settings = self.config.bind(("database",), DatabaseSettings).value
+        self.assertEqual(settings, DatabaseSettings(
+            host="db.example.com",
+            port=5432,
+            buffer=2048,
+            started=datetime.date(2020, 1, 2),
+            replicas=[],
+            data_dir=Path("/var/data"),
+            pool=PoolSettings(5, datetime.timedelta(minutes=5))
+        ))
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            settings.port = 1
+
+    def test_bind_named_tuple(self):
+        self.assertEqual(self.config.bind("limits", Limits).value, Limits(10, 1.5))
+
+    def test_rebuilt_on_reload(self):
+        binding = self.config.bind(("database",), DatabaseSettings)
+        before = binding.value
+        self.config.set_defaults({"database": {"host": "other", "port": 1, "buffer": 1}})
+        self.config.reload_config()
+        self.assertIsNot(binding.value, before)
+        self.assertEqual(binding.value.port, 1)
+        self.assertEqual(binding.value.pool, PoolSettings())
+
+    def test_missing_value(self):
+        with self.assertRaises(ValueError):
+            self.config.bind(("limits",), DatabaseSettings)
+
+    def test_invalid_value_on_reload(self):
+        binding = self.config.bind(("database",), DatabaseSettings)
+        limits = self.config.bind("limits", Limits)
+        before = binding.value
+        loads = []
+        self.config.on_load(lambda config: loads.append(config["database", "port"]))
+        self.config.set_defaults({"database": {"host": "other", "port": "abc", "buffer": 1}, "limits": {"requests": "20"}})
+        with self.assertLogs("zirconium", "ERROR"):
+            self.config.reload_config()
+        self.assertIs(binding.value, before)
+        self.assertEqual(limits.value.requests, 20)
+        self.assertEqual(loads, ["abc"])
@@ -0,0 +1,145 @@
+import unittest
+import tempfile
+import shutil
+import os
+from pathlib import Path
+
+import zirconium
+from zirconium.cache import ParseCache
+
+
+class CountingParser(zirconium.JsonConfigParser):
+
+    def __init__(self):
+        self.calls = 0
+
+    def read_dict(self, path, encoding: str):
+        self.calls += 1
+        return super().read_dict(path, encoding)
+
+
+class TestParseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.cache_dir = self.directory / "cache"
+        self.config_file = self.directory / "config.json"
+        self.config_file.write_text('{"one": 1}')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _load(self, parser, **kwargs):
+        config = zirconium.ApplicationConfig(True)
+        config.enable_parse_cache(self.cache_dir, **kwargs)
+        config.register_file(self.config_file, parser=parser)
+        config.init()
+        return config
+
+    def test_cache_hit(self):
+        parser = CountingParser()
+        self.assertEqual(self._load(parser)["one"], 1)
+        self.assertEqual(self._load(parser)["one"], 1)
+        self.assertEqual(parser.calls, 1)
+
+    def test_modified_file(self):
+        parser = CountingParser()
+        self._load(parser)
+        self.config_file.write_text('{"one": 11}')
+        self.assertEqual(self._load(parser)["one"], 11)
+        self.assertEqual(parser.calls, 2)
+
+    def test_verify_hash(self):
+        parser = CountingParser()
+        self._load(parser, verify_hash=True)
+        st = os.stat(self.config_file)
+        # Same size and modification time, different content
+        self.config_file.write_text('{"one": 2}')
+        os.utime(self.config_file, ns=(st.st_atime_ns, st.st_mtime_ns))
+        self.assertEqual(self._load(parser, verify_hash=True)["one"], 2)
+        self.assertEqual(parser.calls, 2)
+
+    def test_corrupt_entry(self):
+        parser = CountingParser()
+        self._load(parser)
+        for entry in self.cache_dir.glob("*.zcache"):
+            entry.write_bytes(b"not a pickle")
+        self.assertEqual(self._load(parser)["one"], 1)
+        self.assertEqual(parser.calls, 2)
+
+    @unittest.skipUnless(hasattr(os, "getuid"), "Unix permissions only")
+    def test_permissions(self):
+        parser = CountingParser()
+        self._load(parser)
+        self.assertEqual(self.cache_dir.stat().st_mode & 0o777, 0o700)
+        for entry in self.cache_dir.glob("*.zcache"):
+            entry.chmod(0o666)
+        with self.assertLogs("zirconium", "WARNING"):
+            self.assertEqual(self._load(parser)["one"], 1)
+        self.assertEqual(parser.calls, 2)
+        self.cache_dir.chmod(0o777)
+        with self.assertLogs("zirconium", "WARNING"):
+            self._load(parser)
+            self._load(parser)
+        self.assertEqual(parser.calls, 4)
+
+    def test_eviction(self):
+        cache = ParseCache(self.cache_dir, max_size=1)
+        parser = CountingParser()
+        data, stamp = cache.lookup(self.config_file, parser, "utf-8")
+        self.assertIsNone(data)
+        cache.store(self.config_file, parser, "utf-8", stamp, {"one": 1})
+        self.assertEqual(len(list(self.cache_dir.glob("*.zcache"))), 0)
+        cache.max_size = 1048576
+        cache.store(self.config_file, parser, "utf-8", stamp, {"one": 1})
+        self.assertEqual(cache.lookup(self.config_file, parser, "utf-8")[0], {"one": 1})
+
+
+class TestIncrementalReload(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.file_one = self.directory / "one.json"
+        self.file_one.write_text('{"one": 1, "nested": {"a": 1}}')
+        self.file_two = self.directory / "two.json"
+        self.file_two.write_text('{"two": 2, "nested": {"b": 2}}')
+        self.parser = CountingParser()
+        self.config = zirconium.ApplicationConfig(True)
+        self.config.register_file(self.file_one, parser=self.parser)
+        self.config.register_file(self.file_two, parser=self.parser)
+        self.config.init()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_no_change(self):
+        identifier = self.config.cache_identifier
+        self.config.reload_config()
+        self.assertEqual(self.parser.calls, 2)
+        self.assertEqual(self.config.cache_identifier, identifier)
+        self.assertEqual(self.config["nested"], {"a": 1, "b": 2})
+
+    def test_changed_file(self):
+        self.file_two.write_text('{"two": 22, "nested": {"c": 3}}')
+        self.config.reload_config()
+        self.assertEqual(self.parser.calls, 3)
+        self.assertEqual(self.config["two"], 22)
+        # The content kept for one.json must not have been modified by merging two.json into it
+        self.assertEqual(self.config["nested"], {"a": 1, "c": 3})
+
+    def test_modified_config(self):
+        self.config.load_from_dict({"one": 11})
+        self.config.reload_config()
+        self.assertEqual(self.parser.calls, 2)
+        self.assertEqual(self.config["one"], 1)
+
+    def test_full_reload(self):
+        self.config.reload_config(full=True)
+        self.assertEqual(self.parser.calls, 4)
+
+    def test_new_environment_variable(self):
+        self.config.register_environ_var("ZR_INCREMENTAL_TEST", "from_env")
+        os.environ["ZR_INCREMENTAL_TEST"] = "yes"
+        self.config.reload_config()
+        self.assertEqual(self.config["from_env"], "yes")
+        self.assertEqual(self.parser.calls, 2)
@@ -2,10 +2,24 @@ import unittest
 import datetime
 import decimal
 import os
+import sys
+import threading
+import typing as t
 from pathlib import Path
 
 from autoinject import injector
 import zirconium
+from zirconium.utils import MutableDeepDict, PathIndex, copy_tree, share_subtrees
+
+
+def _built_index(root):
+    mdd = MutableDeepDict(root)
+    mdd.build_index()
+    return mdd._index
+
+
+class Port(t.NamedTuple):
+    port: int
 
 
 class TestConfig(unittest.TestCase):
@@ -23,6 +37,27 @@ class TestConfig(unittest.TestCase):
             self.assertEqual(cfg.get(("foo", "bar3")), "hello world3")
         _test_inject()
 
+    def test_lazy_parsers(self):
+        config = zirconium.ApplicationConfig(True)
+        self.assertEqual(config._builtin_parsers, {})
+        self.assertIsInstance(config.find_parser("foo.JSON"), zirconium.JsonConfigParser)
+        self.assertEqual(list(config._builtin_parsers.keys()), [".json"])
+        self.assertIsNone(config.find_parser("foo.unknown"))
+        custom = zirconium.JsonConfigParser()
+        custom.handles = lambda path: path.endswith(".custom")
+        config.register_parser(custom)
+        self.assertIs(config.find_parser("foo.custom"), custom)
+        self.assertIsInstance(config.find_parser("foo.yaml"), zirconium.YamlConfigParser)
+        override = zirconium.JsonConfigParser()
+        override.handles = lambda path: True
+        config.register_parser(override, suffixes=[".YAML", "yml"])
+        self.assertIs(config.find_parser("foo.yaml"), override)
+        self.assertIs(config.find_parser("foo.yml"), override)
+        self.assertIsInstance(config.find_parser("foo.json"), zirconium.JsonConfigParser)
+        self.assertIsNot(config.find_parser("foo.json"), override)
+        eps = zirconium.config.cached_entry_points("zirconium.parsers")
+        self.assertIs(zirconium.config.cached_entry_points("zirconium.parsers"), eps)
+
     def test_env_map(self):
         config = zirconium.ApplicationConfig(True)
         os.environ.setdefault("ONE", "1")
@@ -65,6 +100,16 @@ class TestConfig(unittest.TestCase):
         self.assertEqual(config["CONFIG_C"], "O2C")
         self.assertEqual(config["CONFIG_D"], "DD")
 
+    def test_defaults_not_modified(self):
+        config = zirconium.ApplicationConfig(True)
+        config.set_defaults({"nested": {"a": "default"}})
+        config.register_file(Path(__file__).parent / "example_configs/basic.yaml")
+        config.load_from_dict({"nested": {"a": "loaded"}})
+        config.init()
+        config.deep_update({"nested": {"a": "updated"}})
+        config.reload_config()
+        self.assertEqual(config[("nested", "a")], "default")
+
     def test_env(self):
         config = zirconium.ApplicationConfig(True)
         os.environ.setdefault("FOOBAR", "bonjour")
@@ -112,6 +157,27 @@ class TestConfig(unittest.TestCase):
         self.assertIsInstance(config["twelve"], list)
         self.assertEqual(config["seventeen"], datetime.datetime(2020, 1, 1, 1, 2, 3))
 
+    def test_parallel_loading(self):
+        files = [
+            Path(__file__).parent / "example_configs/basic.yaml",
+            Path(__file__).parent / "example_configs/override.toml",
+            Path(__file__).parent / "example_configs/basic.json",
+            Path(__file__).parent / "example_configs/override2.yaml",
+            Path(__file__).parent / "example_configs/basic.yaml",
+        ]
+        sequential = zirconium.ApplicationConfig(True)
+        for file in files:
+            sequential.register_file(file)
+        sequential.init()
+        for use_processes in (False, True):
+            config = zirconium.ApplicationConfig(True)
+            config.set_parallel_loading(max_workers=2, use_processes=use_processes)
+            for file in files:
+                config.register_file(file)
+            config.init()
+            self.assertEqual(config.d, sequential.d)
+            self.assertEqual(config.loaded_files, sequential.loaded_files)
+
     def test_environment_replacement(self):
         config = zirconium.ApplicationConfig(True)
         os.environ["VAR_NAME"] = "var"
@@ -150,6 +216,25 @@ class TestConfig(unittest.TestCase):
         self.assertEqual(config["complex_inner"], "inner")
         self.assertEqual(config["weird_bracket_default"], "bar")
 
+    def test_environment_template_cache(self):
+        config = zirconium.ApplicationConfig(True)
+        os.environ["TEMPLATE_VAR"] = "one"
+        config.load_from_dict({
+            "plain": "no references here",
+            "escaped": "$${TEMPLATE_VAR}",
+            "ref": "a ${TEMPLATE_VAR} b",
+        })
+        self.assertIs(config["plain"], config.get("plain", raw=True))
+        self.assertEqual(config["escaped"], "${TEMPLATE_VAR}")
+        self.assertEqual(config["ref"], "a one b")
+        os.environ["TEMPLATE_VAR"] = "two"
+        self.assertEqual(config["ref"], "a two b")
+        self.assertEqual(
+            zirconium.utils.compile_env_template("a ${TEMPLATE_VAR} b"),
+            ("a ", ("TEMPLATE_VAR", ""), " b")
+        )
+        self.assertEqual(zirconium.utils.compile_env_template("${X=y}"), (("X", "y"),))
+
     def test_list_access(self):
         path = Path(__file__).parent / "example_configs/basic.yaml"
         config = zirconium.ApplicationConfig(True)
@@ -168,6 +253,43 @@ class TestConfig(unittest.TestCase):
         del config["test", "two"]
         self.assertFalse(("test", "two") in config)
 
+    def test_path_index(self):
+        path = Path(__file__).parent / "example_configs/basic.yaml"
+        config = zirconium.ApplicationConfig(True)
+        config.enable_path_index()
+        config.register_file(path)
+        config.set_defaults({
+            "services": {
+                "web": {"port": 80},
+                "api": {"port": 8080, "host": "localhost"},
+                "worker": {"threads": 4},
+            }
+        })
+        config.init()
+        self.assertEqual(config[("seven", "eight", "nine")], "nine")
+        self.assertTrue(("seven", "eight") in config)
+        self.assertFalse(("seven", "nine") in config)
+        self.assertEqual(config.find("services.*.port"), {
+            ("services", "web", "port"): 80,
+            ("services", "api", "port"): 8080,
+        })
+        config[("services", "db", "port")] = 5432
+        self.assertEqual(config.as_int(("services", "db", "port")), 5432)
+        self.assertEqual(len(config.find(("services", "*", "port"))), 3)
+        config.deep_update({"services": {"web": {"port": 81}}})
+        self.assertEqual(config[("services", "web", "port")], 81)
+        self.assertEqual(config[("services", "api", "host")], "localhost")
+        del config["services", "api"]
+        self.assertFalse(("services", "api", "port") in config)
+        self.assertEqual(config.pop(("services", "worker"), None), {"threads": 4})
+        self.assertFalse(("services", "worker", "threads") in config)
+        config[("services", "web", "port", "number")] = 82
+        self.assertEqual(config[("services", "web", "port", "number")], 82)
+        config.update({"services": 5})
+        self.assertFalse(("services", "web") in config)
+        self.assertIsNone(config.get("services", "web"))
+        self.assertRaises(ValueError, config.__getitem__, ("services", "web"))
+
     def test_integer_index(self):
         config = zirconium.ApplicationConfig(True)
         config.load_from_dict({
@@ -197,6 +319,24 @@ class TestConfig(unittest.TestCase):
         })
         self.assertEqual(r.raw_value(), "two")
 
+    def test_eager_refs(self):
+        config = zirconium.ApplicationConfig(True)
+        config.set_defaults({"one": "1"})
+        config.init()
+        config.enable_eager_refs()
+        r = config.as_int_ref("one")
+        self.assertFalse(hasattr(r, "__dict__"))
+        self.assertIs(config.as_int_ref("one", default=1).kwargs["default"], 1)
+        self.assertIs(config.as_int_ref("one", default=True).kwargs["default"], True)
+        self.assertEqual(len(config._live_refs()), 1)
+        config.set_defaults({"one": "2"})
+        config.reload_config()
+        config._ref_refresher.join()
+        self.assertEqual(r._state, (config.cache_identifier, 2))
+        self.assertEqual(r.raw_value(), 2)
+        del r
+        self.assertEqual(len(config._live_refs()), 0)
+
     def test_clear(self):
         config = zirconium.ApplicationConfig(True)
         config.load_from_dict({
@@ -217,6 +357,162 @@ class TestConfig(unittest.TestCase):
         self.assertFalse(2 in config)
         self.assertEqual(config[1], "new_one")
 
+    def test_snapshot(self):
+        config = zirconium.ApplicationConfig(True)
+        config.set_defaults({"database": {"host": "one", "port": "1"}})
+        config.init()
+        with config.snapshot() as snap:
+            config.set_defaults({"database": {"host": "two", "port": "2"}})
+            config.reload_config()
+            config["extra"] = True
+            self.assertEqual(snap["database", "host"], "one")
+            self.assertEqual(snap.as_int(("database", "port")), 1)
+            self.assertFalse("extra" in snap)
+        self.assertEqual(config["database", "host"], "two")
+        self.assertEqual(config.as_int(("database", "port")), 2)
+        self.assertTrue(config["extra"])
+
+    def test_refs_in_snapshot(self):
+        config = zirconium.ApplicationConfig(True)
+        config.set_defaults({"port": "1"})
+        config.init()
+        ref = config.as_int_ref("port")
+        with config.snapshot():
+            config.set_defaults({"port": "2"})
+            config.reload_config()
+            self.assertEqual(ref.raw_value(), 1)
+            binding = config.bind((), Port)
+        self.assertEqual(ref.raw_value(), 2)
+        self.assertEqual(binding.value.port, 2)
+
+    def test_sections_are_copies(self):
+        config = zirconium.ApplicationConfig(True)
+        config.set_defaults({"db": {"port": "1", "hosts": ["one"]}})
+        config.init()
+        with config.snapshot() as snap:
+            self.assertEqual(config.as_int(("db", "port")), 1)
+            config.as_dict("db")["port"] = "2"
+            config.get("db")["port"] = "3"
+            config["db", "hosts"].append("two")
+            self.assertEqual(snap["db", "port"], "1")
+            self.assertEqual(config.as_int(("db", "port")), 1)
+            self.assertEqual(config["db"], {"port": "1", "hosts": ["one"]})
+
+    def test_reload_never_empty(self):
+        config = zirconium.ApplicationConfig(True)
+        seen = []
+        config.on_load(lambda c: seen.append(dict(c.d)))
+        config.set_defaults({"one": 1})
+        config.init()
+        old = config.d
+        config.reload_config(full=True)
+        self.assertEqual(old, {"one": 1})
+        self.assertEqual(seen, [{"one": 1}, {"one": 1}])
+
+    def test_on_change(self):
+        config = zirconium.ApplicationConfig(True)
+        config.set_defaults({"database": {"host": "one", "port": 1}, "cache": {"size": 5}, "flag": True})
+        config.init()
+        calls = []
+        config.on_change(("database",), lambda old, new: calls.append(("database", old, new)))
+        config.on_change(("database", "host"), lambda old, new: calls.append(("host", old, new)))
+        config.on_change("cache", lambda old, new: calls.append(("cache", old, new)))
+        config.on_change(("flag", "nested"), lambda old, new: calls.append(("flag", old, new)))
+        config.set_defaults({"database": {"host": "one", "port": 2}})
+        config.reload_config()
+        self.assertEqual(calls, [("database", {"host": "one", "port": 1}, {"host": "one", "port": 2})])
+        calls.clear()
+        config.set_defaults({"flag": {"nested": 1}})
+        config.reload_config()
+        self.assertEqual(calls, [("flag", None, 1)])
+        calls.clear()
+        config.set_defaults({"flag": 1})
+        config.reload_config()
+        self.assertEqual(calls, [("flag", 1, None)])
+        calls.clear()
+        config.reload_config(full=True)
+        self.assertEqual(calls, [])
+
+    def test_on_change_types(self):
+        config = zirconium.ApplicationConfig(True)
+        config.set_defaults({"flags": [1, 0], "ratio": [1]})
+        config.init()
+        calls = []
+        config.on_change("flags", lambda old, new: calls.append((old, new)))
+        config.on_change("ratio", lambda old, new: calls.append((old, new)))
+        config.set_defaults({"flags": [True, False], "ratio": [1.0]})
+        config.reload_config()
+        self.assertCountEqual(calls, [([1, 0], [True, False]), ([1], [1.0])])
+
+    def test_load_stats(self):
+        path = Path(__file__).parent / "example_configs/basic.yaml"
+        path2 = Path(__file__).parent / "example_configs/override.toml"
+        config = zirconium.ApplicationConfig(True)
+        config.register_file(path)
+        config.register_file(path2)
+        config.init()
+        self.assertIsNone(config.load_stats)
+        hooked = []
+        config.on_load_stats(hooked.append)
+        config.on_load(lambda c: None)
+        config.reload_config(full=True)
+        stats = config.load_stats
+        self.assertEqual(hooked, [stats])
+        self.assertEqual(
+            [entry.phase for entry in stats.phases],
+            ["start", "read", "merge", "read", "merge", "secrets", "environment", "publish", "callback"]
+        )
+        sources = stats.sources()
+        self.assertEqual(list(sources), [str(path.absolute()), str(path2.absolute())])
+        self.assertEqual(sources[str(path.absolute())]["size"], path.stat().st_size)
+        self.assertFalse(sources[str(path.absolute())]["reused"])
+        self.assertEqual(stats.bytes_read, path.stat().st_size + path2.stat().st_size)
+        self.assertGreaterEqual(stats.duration, sum(stats.totals().values()))
+        config.set_defaults({"extra": 1})
+        config.reload_config()
+        self.assertTrue(all(info["reused"] for info in config.load_stats.sources().values()))
+        self.assertEqual(config.load_stats.bytes_read, 0)
+        config.enable_load_stats(False)
+        config.reload_config(full=True)
+        self.assertIsNone(config.load_stats)
+
+    def test_access_stats(self):
+        config = zirconium.ApplicationConfig(True)
+        config.set_defaults({
+            "database": {"host": "localhost", "port": "5432", "options": {"timeout": "5"}},
+            "cache": {"size": 5, "hosts": ["one", "two"]},
+            "unused": {"a": 1, "b": {}},
+        })
+        config.init()
+        self.assertIsNone(config.access_report())
+        config.enable_access_stats()
+
+        def _read():
+            for _ in range(10):
+                config.as_int(("database", "port"))
+                config["database", "host"]
+            config.get("database", "options")
+            config.as_list(["cache", "hosts"])
+
+        threads = [threading.Thread(target=_read) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # The counts of threads that ended are merged rather than kept apart
+        self.assertEqual(config._access_stats._thread_counts, {})
+        config.as_str(("database", "port"))
+        report = config.access_report(top=2)
+        self.assertEqual(report["reads"], 67)
+        self.assertEqual(report["hot"], [(("database", "port"), 31), (("database", "host"), 30)])
+        self.assertEqual(report["methods"][("database", "port")], {"as_int": 30, "as_str": 1})
+        self.assertEqual(report["methods"][("cache", "hosts")], {"as_list": 3})
+        self.assertEqual(report["never_read"], [("cache", "size"), ("unused", "a"), ("unused", "b")])
+        config.enable_access_stats(sample_every=4)
+        for _ in range(8):
+            config.get("cache", "size")
+        self.assertEqual(config.access_report()["methods"], {("cache", "size"): {"get": 8}})
+
     def test_len(self):
         config = zirconium.ApplicationConfig(True)
         self.assertEqual(len(config), 0)
@@ -272,6 +568,111 @@ class TestConfig(unittest.TestCase):
         self.assertEqual(config["six"], 66)
         self.assertEqual(config["two"], 2)
 
+    def test_deep_update_deep_tree(self):
+        def _chain(depth, leaf):
+            tree = {"leaf": leaf}
+            for level in range(depth):
+                tree = {"next": tree, f"level{level}": leaf}
+            return tree
+
+        depth = sys.getrecursionlimit() * 2
+        mdd = MutableDeepDict(_chain(depth, 1))
+        mdd.deep_update(_chain(depth, 2))
+        node = mdd.d
+        for _ in range(depth):
+            node = node["next"]
+        self.assertEqual(node, {"leaf": 2})
+
+    def test_deep_update_index(self):
+        base = {"a": {"b": {"c": 1, "d": [1, 2]}, "e": 2}, "f": {"g": 3}, "h": 4}
+        overlay = {"a": {"b": {"c": 10, "x": {"y": 1}}, "e": {"z": 1}}, "f": 30, "h": {"i": 4}}
+        for copy_on_write in (False, True):
+            mdd = MutableDeepDict(copy_tree(base), indexed=True, copy_on_write=copy_on_write)
+            original = mdd.d
+            mdd.deep_update(overlay)
+            self.assertEqual(mdd.d, {
+                "a": {"b": {"c": 10, "d": [1, 2], "x": {"y": 1}}, "e": {"z": 1}},
+                "f": 30,
+                "h": {"i": 4},
+            })
+            self.assertEqual(original is mdd.d, not copy_on_write)
+            if copy_on_write:
+                self.assertEqual(original, base)
+            index = mdd._index
+            mdd.build_index()
+            self.assertEqual(index, mdd._index)
+            for path, value in index.items():
+                self.assertIs(value, mdd._index[path])
+
+    def test_copy_on_write_index(self):
+        mdd = MutableDeepDict({f"key{i}": {"value": i} for i in range(100)}, indexed=True, copy_on_write=True)
+        versions = []
+        for i in range(50):
+            versions.append((mdd.d, mdd._index))
+            mdd[f"key{i}", "value"] = -i
+            del mdd[f"key{99 - i}"]
+        for i, (root, index) in enumerate(versions):
+            self.assertEqual(index.get((f"key{i}", "value")), i)
+            self.assertTrue((f"key{99 - i}",) in index)
+            self.assertEqual(dict(index), _built_index(root))
+        self.assertIsInstance(mdd._index, PathIndex)
+        self.assertEqual(dict(mdd._index), _built_index(mdd.d))
+        self.assertFalse(("key99",) in mdd._index)
+        self.assertIsNone(mdd.get("key99", "value"))
+        self.assertEqual(mdd["key10", "value"], -10)
+
+    def test_share_subtrees(self):
+        old = {"a": {"b": {"c": 1}, "d": [1, 2]}, "e": {"f": 1}, "g": 1}
+        new = {"a": {"b": {"c": 1}, "d": [1, 2]}, "e": {"f": True}, "g": 1, "h": {}}
+        shared = share_subtrees(old, new)
+        self.assertEqual(shared, new)
+        self.assertIs(shared["a"], old["a"])
+        self.assertIsNot(shared["e"], old["e"])
+        self.assertIs(shared["e"]["f"], True)
+        self.assertEqual(new["a"]["d"], [1, 2])
+        self.assertIsNot(new["a"], old["a"])
+        self.assertIs(share_subtrees(old, copy_tree(old)), old)
+        eastern = datetime.timezone(datetime.timedelta(hours=-5))
+        moment = datetime.datetime(2020, 1, 1, 12, tzinfo=datetime.timezone.utc)
+        old = {"flags": [1, 0], "when": moment, "ratio": (0.0,), "price": decimal.Decimal("1.0")}
+        new = {"flags": [True, False], "when": moment.astimezone(eastern), "ratio": (-0.0,), "price": decimal.Decimal("1.00")}
+        shared = share_subtrees(old, new)
+        for key in old:
+            self.assertIs(shared[key], new[key])
+
+    def test_reload_changed_types(self):
+        config = zirconium.ApplicationConfig(True)
+        config.keep_history()
+        config.set_defaults({"flags": [1, 0]})
+        config.init()
+        config.set_defaults({"flags": [True, False]})
+        config.reload_config()
+        self.assertIs(config["flags"][0], True)
+
+    def test_history(self):
+        config = zirconium.ApplicationConfig(True)
+        config.set_defaults({"database": {"host": "one", "port": 1}, "cache": {"size": 5}})
+        config.keep_history(2)
+        config.enable_path_index()
+        config.init()
+        first = config.d
+        changes = []
+        config.on_change("database", lambda old, new: changes.append((old, new)))
+        for port in (2, 3, 4):
+            config.set_defaults({"database": {"host": "one", "port": port}})
+            config.reload_config()
+        self.assertEqual([root["database"]["port"] for root in config.history], [2, 3])
+        self.assertIs(config.d["cache"], first["cache"])
+        self.assertIs(config.history[0]["cache"], first["cache"])
+        self.assertTrue(config.rollback())
+        self.assertEqual(config["database", "port"], 3)
+        self.assertEqual(changes[-1], ({"host": "one", "port": 4}, {"host": "one", "port": 3}))
+        self.assertTrue(config.rollback())
+        self.assertFalse(config.rollback())
+        self.assertEqual(config["database", "port"], 2)
+        config.reload_config()
+        self.assertEqual(config["database", "port"], 4)
+
     def test_update(self):
         config = zirconium.ApplicationConfig(True)
         config.load_from_dict({
@@ -459,6 +860,39 @@ class TestConfig(unittest.TestCase):
         self.assertEqual(config.as_str("int"), "12")
         self.assertEqual(config.as_int("int"), 12)
 
+    def test_getter_cache(self):
+        config = zirconium.ApplicationConfig(True)
+        os.environ["CACHED_TIMEOUT"] = "5m"
+        config.set_defaults({
+            "int": "12",
+            "timeout": "${CACHED_TIMEOUT}",
+        })
+        config.init()
+        self.assertEqual(config.as_int("int"), 12)
+        self.assertEqual(config.as_int("int"), 12)
+        self.assertEqual(config.cache_stats()["hits"], 1)
+        self.assertEqual(config.cache_stats()["misses"], 1)
+        self.assertEqual(config.as_timedelta("timeout"), datetime.timedelta(minutes=5))
+        os.environ["CACHED_TIMEOUT"] = "10m"
+        self.assertEqual(config.as_timedelta("timeout"), datetime.timedelta(minutes=10))
+        config["int"] = "13"
+        self.assertEqual(config.as_int("int"), 13)
+        config.reload_config()
+        self.assertEqual(config.as_int("int"), 12)
+        self.assertEqual(config.as_int(["int"]), 12)
+        config.set_cache_size(1)
+        config.as_int("int")
+        config.as_str("int")
+        self.assertEqual(config.cache_stats()["size"], 1)
+
+    def test_getter_cache_default_type(self):
+        config = zirconium.ApplicationConfig(True)
+        config.init()
+        self.assertEqual(config.as_str("missing", default=1), "1")
+        self.assertEqual(config.as_str("missing", default=1.0), "1.0")
+        self.assertEqual(config.as_str("missing", True), "True")
+        self.assertEqual(config.as_str("missing", 1), "1")
+
     def test_float_coerce(self):
         config = zirconium.ApplicationConfig(True)
         config.load_from_dict({
@@ -1,7 +1,11 @@
 import unittest
 import datetime
 import logging
+import shutil
+import sqlite3
+import tempfile
 from pathlib import Path
+from unittest import mock
 
 import zirconium
 
@@ -71,6 +75,27 @@ class TestYamlFiles(unittest.TestCase):
             self.assertEqual(config[key], TEST_PATHS[key])
 
 
+    def test_multiple_documents(self):
+        directory = Path(tempfile.mkdtemp())
+        try:
+            path = directory / "config.yml"
+            path.write_text("one: 1\nnested:\n  a: 1\n  b: 2\n---\n---\n- not a dict\n---\nnested:\n  b: 3\ntwo: 2\n")
+            handler = zirconium.YamlConfigParser()
+            self.assertTrue(handler.handles(path.name))
+            with self.assertLogs("zirconium.parsers", logging.WARNING):
+                config = handler.read_dict(path, "utf-8")
+            self.assertEqual(config, {"one": 1, "two": 2, "nested": {"a": 1, "b": 3}})
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def test_pure_python_loader(self):
+        path = Path(__file__).parent / "example_configs/basic.yaml"
+        fast = zirconium.YamlConfigParser()
+        slow = zirconium.YamlConfigParser()
+        slow.use_libyaml = False
+        self.assertEqual(fast.read_dict(path, "utf-8"), slow.read_dict(path, "utf-8"))
+
+
 class TestTomlFiles(unittest.TestCase):
 
     def test_basic_file(self):
@@ -173,6 +198,26 @@ class TestJsonFiles(unittest.TestCase):
         self.assertEqual(len(config), 0)
         self.assertLogs("zirconium.parsers")
 
+    def test_backends(self):
+        path = Path(__file__).parent / "example_configs/basic.json"
+        fast = zirconium.JsonConfigParser()
+        stdlib = zirconium.JsonConfigParser()
+        stdlib.backend = "json"
+        self.assertEqual(fast.read_dict(path, "utf-8"), stdlib.read_dict(path, "utf-8"))
+        path = Path(__file__).parent / "example_configs/utf-16-be.json"
+        self.assertEqual(fast.read_dict(path, "utf-16-be"), stdlib.read_dict(path, "utf-16-be"))
+
+    def test_stdlib_only_values(self):
+        directory = Path(tempfile.mkdtemp())
+        try:
+            path = directory / "nan.json"
+            path.write_text('{"nan": NaN, "big": 123456789012345678901234567890}')
+            config = zirconium.JsonConfigParser().read_dict(path, "utf-8")
+            self.assertNotEqual(config["nan"], config["nan"])
+            self.assertEqual(config["big"], 123456789012345678901234567890)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
     def test_invalid_file(self):
         path = Path(__file__).parent / "example_configs/invalid.json"
         handler = zirconium.JsonConfigParser()
@@ -255,6 +300,48 @@ class TestIniFiles(unittest.TestCase):
             self.assertEqual(config["section"][key], TEST_PATHS[key])
 
 
+class TestMemoryMappedReads(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_read_bytes(self):
+        path = self.directory / "file.bin"
+        path.write_bytes(b"content")
+        with zirconium.parsers.read_bytes(path) as buffer:
+            self.assertIsInstance(buffer, bytes)
+        with zirconium.parsers.read_bytes(path, threshold=1) as buffer:
+            self.assertNotIsInstance(buffer, bytes)
+            self.assertEqual(buffer[:], b"content")
+        path.write_bytes(b"")
+        with zirconium.parsers.read_bytes(path, threshold=0) as buffer:
+            self.assertEqual(buffer, b"")
+
+    def test_parsers(self):
+        json_path = Path(__file__).parent / "example_configs/basic.json"
+        utf16_path = Path(__file__).parent / "example_configs/utf-16-be.json"
+        toml_path = self.directory / "crlf.toml"
+        toml_path.write_bytes(b'one = "a"\r\ntwo = """x\r\ny"""\r\n')
+        stdlib = zirconium.JsonConfigParser()
+        stdlib.backend = "json"
+        expected = [
+            zirconium.JsonConfigParser().read_dict(json_path, "utf-8"),
+            stdlib.read_dict(json_path, "utf-8"),
+            zirconium.JsonConfigParser().read_dict(utf16_path, "utf-16-be"),
+            zirconium.TomlConfigParser().read_dict(toml_path, "utf-8"),
+        ]
+        with mock.patch.object(zirconium.parsers, "MMAP_THRESHOLD", 1):
+            self.assertEqual(zirconium.JsonConfigParser().read_dict(json_path, "utf-8"), expected[0])
+            self.assertEqual(stdlib.read_dict(json_path, "utf-8"), expected[1])
+            self.assertEqual(zirconium.JsonConfigParser().read_dict(utf16_path, "utf-16-be"), expected[2])
+            self.assertEqual(zirconium.TomlConfigParser().read_dict(toml_path, "utf-8"), expected[3])
+            self.assertRaises(UnicodeDecodeError, zirconium.JsonConfigParser().read_dict, utf16_path, "utf-8")
+        self.assertEqual(expected[3], {"one": "a", "two": "x\ny"})
+
+
 class TestDBConfig(unittest.TestCase):
 
     def test_basic_db(self):
@@ -271,3 +358,68 @@ class TestDBConfig(unittest.TestCase):
 
     def test_bad_table(self):
         p = Path(__file__).parent / "example_configs/basic.db"
+        path = "sqlite:///{}/missing/key/value".format(str(p.absolute()).replace("\\", "\\\\"))
+        self.assertEqual(zirconium.DbConfigParser().read_dict(path, "ascii"), {})
+
+    def test_engine_cache(self):
+        p = Path(__file__).parent / "example_configs/basic.db"
+        path = "sqlite:///{}/config/key/value".format(str(p.absolute()).replace("\\", "\\\\"))
+        zirconium.DbConfigParser().read_dict(path, "ascii")
+        engines = dict(zirconium.parsers._db_engines)
+        zirconium.DbConfigParser().read_dict(path, "ascii")
+        self.assertEqual(engines, zirconium.parsers._db_engines)
+
+
+class TestDBIncremental(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        db_file = self.directory / "config.db"
+        self.conn = sqlite3.connect(db_file)
+        self.conn.execute("CREATE TABLE config(key VARCHAR(1024) UNIQUE, value VARCHAR(1024), version INTEGER)")
+        self.conn.executemany("INSERT INTO config VALUES (?, ?, ?)", [("one", "1", 1), ("two", "2", 2)])
+        self.conn.commit()
+        self.path = "sqlite:///{}/config/key/value".format(str(db_file.absolute()).replace("\\", "\\\\"))
+        self.parser = zirconium.DbConfigParser(version_column="version")
+
+    def tearDown(self):
+        self.conn.close()
+        zirconium.parsers.dispose_db_engines()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_incremental(self):
+        self.assertEqual(self.parser.read_dict(self.path, "ascii").d, {"one": "1", "two": "2"})
+        token = self.parser.change_token(self.path, "ascii")
+        self.assertEqual(token, (2, 2))
+        self.conn.execute("UPDATE config SET value = '11', version = 3 WHERE key = 'one'")
+        self.conn.execute("INSERT INTO config VALUES ('three', '3', 4)")
+        self.conn.commit()
+        self.assertNotEqual(self.parser.change_token(self.path, "ascii"), token)
+        self.assertEqual(self.parser.read_dict(self.path, "ascii").d, {"one": "11", "two": "2", "three": "3"})
+
+    def test_deleted_rows(self):
+        self.parser.read_dict(self.path, "ascii")
+        self.conn.execute("DELETE FROM config WHERE key = 'two'")
+        self.conn.commit()
+        self.assertEqual(self.parser.read_dict(self.path, "ascii").d, {"one": "1"})
+
+    def test_register_file(self):
+        config = zirconium.ApplicationConfig(True)
+        config.register_parser(self.parser)
+        config.register_file(self.path)
+        config.enable_load_stats()
+        config.init()
+        self.assertEqual(config["one"], "1")
+        stats = config.load_stats
+        config.reload_config()
+        # Skipped, since the change token of the table is the same
+        self.assertIs(config.load_stats, stats)
+        self.conn.execute("UPDATE config SET value = '11', version = 3 WHERE key = 'one'")
+        self.conn.commit()
+        config.reload_config()
+        self.assertEqual(config["one"], "11")
+        self.assertEqual(config["two"], "2")
+        other = zirconium.ApplicationConfig(True)
+        other.register_file(self.path, parser=zirconium.DbConfigParser())
+        other.init()
+        self.assertEqual(other["one"], "11")
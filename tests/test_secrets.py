@@ -0,0 +1,210 @@
+import time
+import unittest
+from unittest import mock
+
+import zirconium
+import zirconium.sproviders as sp
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeProvider:
+
+    def __init__(self, secrets):
+        self.secrets = secrets
+        self.calls = []
+
+    def __call__(self, secret_path):
+        self.calls.append(secret_path)
+        return self.secrets.get(secret_path)
+
+
+class TestSecretCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.provider = FakeProvider({"db_password": "hunter2", "api_key": "abc"})
+        self.config = zirconium.ApplicationConfig(True)
+        self.config.secret_cache = sp.SecretCache(ttl=60, max_size=2, clock=self.clock)
+        self.config.register_secret_provider("fake", self.provider)
+
+    def test_ttl(self):
+        self.assertEqual(self.config.get_secret("db_password", "fake"), "hunter2")
+        self.assertEqual(self.config.get_secret("db_password", "fake"), "hunter2")
+        self.assertEqual(self.provider.calls, ["db_password"])
+        self.clock.now = 61
+        self.provider.secrets["db_password"] = "rotated"
+        self.assertEqual(self.config.get_secret("db_password", "fake"), "rotated")
+        self.assertEqual(len(self.provider.calls), 2)
+
+    def test_missing_secret(self):
+        self.assertIsNone(self.config.get_secret("nope", "fake"))
+        self.assertIsNone(self.config.get_secret("nope", "fake"))
+        self.assertEqual(self.provider.calls, ["nope"])
+
+    def test_max_size(self):
+        other = FakeProvider({"db_password": "other"})
+        self.config.register_secret_provider("other", other)
+        self.config.get_secret("db_password", "fake")
+        self.assertEqual(self.config.get_secret("db_password", "other"), "other")
+        self.config.get_secret("api_key", "fake")
+        self.config.get_secret("db_password", "fake")
+        self.assertEqual(self.provider.calls, ["db_password", "api_key", "db_password"])
+        self.assertEqual(self.config.secret_cache.stats()["size"], 2)
+
+    def test_environment_interpolation(self):
+        self.config.register_secret_as_environ_var("db_password", "fake", "ZR_SECRET_TEST")
+        self.config.load_from_dict({"a": "${ZR_SECRET_TEST}", "b": "x${ZR_SECRET_TEST}"})
+        self.assertEqual(self.config.get("a"), "hunter2")
+        self.assertEqual(self.config.get("b"), "xhunter2")
+        self.assertEqual(self.provider.calls, ["db_password"])
+
+    def test_disabled(self):
+        self.config.set_secret_cache(ttl=0)
+        self.config.get_secret("db_password", "fake")
+        self.config.get_secret("db_password", "fake")
+        self.assertEqual(len(self.provider.calls), 2)
+
+    def test_full_reload(self):
+        self.config.register_secret_config("db_password", "fake", "database", "password")
+        self.config.init()
+        self.config.reload_config()
+        self.assertEqual(len(self.provider.calls), 1)
+        self.config.reload_config(full=True)
+        self.assertEqual(len(self.provider.calls), 2)
+        self.assertEqual(self.config["database", "password"], "hunter2")
+
+    def test_reload_after_ttl(self):
+        self.config.register_secret_config("db_password", "fake", "database", "password")
+        self.config.init()
+        self.clock.now = 30
+        self.config.reload_config()
+        self.assertEqual(len(self.provider.calls), 1)
+        self.clock.now = 61
+        self.provider.secrets["db_password"] = "rotated"
+        self.config.reload_config()
+        self.assertEqual(len(self.provider.calls), 2)
+        self.assertEqual(self.config["database", "password"], "rotated")
+
+
+class SlowProvider(FakeProvider):
+
+    def __init__(self, secrets, delay):
+        super().__init__(secrets)
+        self.delay = delay
+
+    def __call__(self, secret_path):
+        time.sleep(self.delay.get(secret_path, 0))
+        return super().__call__(secret_path)
+
+
+class BatchProvider(FakeProvider):
+
+    def get_secrets(self, paths):
+        self.calls.append(tuple(paths))
+        return {path: self.secrets[path] for path in paths if path in self.secrets}
+
+
+class TestSecretLoading(unittest.TestCase):
+
+    def setUp(self):
+        self.config = zirconium.ApplicationConfig(True)
+
+    def test_concurrent(self):
+        secrets = {f"secret{i}": str(i) for i in range(5)}
+        provider = SlowProvider(secrets, {name: 0.2 for name in secrets})
+        self.config.register_secret_provider("slow", provider)
+        for name in secrets:
+            self.config.register_secret_config(name, "slow", name)
+        start = time.monotonic()
+        self.config.init()
+        self.assertLess(time.monotonic() - start, 0.6)
+        for name, value in secrets.items():
+            self.assertEqual(self.config[name], value)
+
+    def test_timeout(self):
+        provider = SlowProvider({"fast": "1", "slow": "2"}, {"slow": 1})
+        self.config.register_secret_provider("slow", provider)
+        self.config.set_secret_loading(timeout=0.1)
+        self.config.register_secret_config("fast", "slow", "fast")
+        self.config.register_secret_config("slow", "slow", "slow")
+        start = time.monotonic()
+        self.config.init()
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(self.config["fast"], "1")
+        self.assertFalse("slow" in self.config)
+
+    def test_timeout_more_hung_than_workers(self):
+        provider = SlowProvider({"one": "1", "two": "2", "three": "3", "four": "4"}, {"one": 2, "two": 2, "three": 2})
+        self.config.register_secret_provider("slow", provider)
+        self.config.set_secret_loading(max_workers=2, timeout=0.1)
+        for name in ("one", "two", "three", "four"):
+            self.config.register_secret_config(name, "slow", name)
+        start = time.monotonic()
+        self.config.init()
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertFalse("one" in self.config)
+        self.assertFalse("four" in self.config)
+
+    def test_retry_after_timeout(self):
+        provider = SlowProvider({"fast": "1", "slow": "2"}, {"slow": 1})
+        self.config.register_secret_provider("slow", provider)
+        self.config.set_secret_loading(timeout=0.1)
+        self.config.register_secret_config("fast", "slow", "fast")
+        self.config.register_secret_config("slow", "slow", "slow")
+        self.config.init()
+        self.assertFalse("slow" in self.config)
+        provider.delay["slow"] = 0
+        self.config.reload_config()
+        self.assertEqual(self.config["slow"], "2")
+        # The first call to the slow secret may still be running
+        self.assertEqual(provider.calls.count("fast"), 1)
+
+    def test_batch(self):
+        provider = BatchProvider({"one": "1", "two": "2"})
+        self.config.register_secret_provider("batch", provider)
+        self.config.register_secret_config("one", "batch", "one")
+        self.config.register_secret_config("two", "batch", "two")
+        self.config.register_secret_config("three", "batch", "three")
+        self.config.init()
+        self.assertEqual(provider.calls, [("one", "two", "three")])
+        self.assertEqual(self.config["two"], "2")
+        self.assertFalse("three" in self.config)
+
+    def test_prefetch_environment_secrets(self):
+        provider = FakeProvider({"password": "hunter2"})
+        self.config.register_secret_provider("fake", provider)
+        self.config.register_secret_as_environ_var("password", "fake", "ZR_PREFETCH_TEST")
+        self.config.init()
+        self.assertEqual(provider.calls, ["password"])
+        self.config.load_from_dict({"password": "${ZR_PREFETCH_TEST}"})
+        self.assertEqual(self.config["password"], "hunter2")
+        self.assertEqual(provider.calls, ["password"])
+
+
+class TestAzureClientPool(unittest.TestCase):
+
+    def test_one_client_per_vault(self):
+        client_class = mock.Mock()
+        client_class.return_value.get_secret.return_value.value = "secret"
+        with mock.patch.multiple(
+                sp,
+                AZURE_ENABLED=True,
+                DefaultAzureCredential=mock.Mock(),
+                SecretClient=client_class,
+                HttpResponseError=Exception,
+                _azure_credential=None,
+                _azure_clients={},
+                create=True):
+            self.assertEqual(sp.azure_key_vault("https://one.vault.azure.net/a"), "secret")
+            sp.azure_key_vault("https://one.vault.azure.net/b")
+            sp.azure_key_vault("https://two.vault.azure.net/a")
+            self.assertEqual(client_class.call_count, 2)
+            self.assertEqual(sp.DefaultAzureCredential.call_count, 1)
@@ -0,0 +1,157 @@
+import dataclasses
+import datetime
+import os
+import subprocess
+import sys
+import time
+import unittest
+from pathlib import Path
+
+import zirconium
+from zirconium.sharedmem import SharedConfigPublisher, SharedConfigReader, SharedMapping, encode_tree
+
+
+@dataclasses.dataclass(frozen=True)
+class DatabaseSettings:
+    host: str
+    port: int
+
+
+def _name(suffix):
+    return f"zrtest{os.getpid()}{suffix}"
+
+
+class TestSharedMapping(unittest.TestCase):
+
+    def test_round_trip(self):
+        tree = {
+            "database": {"host": "localhost", "port": 5432, "options": {}},
+            "hosts": ["one", "two"],
+            "started": datetime.date(2020, 1, 1),
+            "name": "été",
+            "empty": None,
+            5: "integer key",
+        }
+        data = encode_tree(tree)
+        root = SharedMapping(memoryview(data), int.from_bytes(data[4:12], "little"))
+        self.assertEqual(root, tree)
+        self.assertEqual(len(root), 6)
+        self.assertEqual(root["database"]["port"], 5432)
+        self.assertIsInstance(root["database"], SharedMapping)
+        self.assertEqual(root[5], "integer key")
+        self.assertTrue("hosts" in root)
+        self.assertFalse("missing" in root)
+        self.assertFalse(["unhashable"] in root)
+        with self.assertRaises(KeyError):
+            root["missing"]
+
+
+class TestSharedMemory(unittest.TestCase):
+
+    def setUp(self):
+        self.master = zirconium.ApplicationConfig(True)
+        self.master.set_defaults({"database": {"host": "one", "port": "1"}, "cache": {"size": 5}})
+        self.master.init()
+        self.name = _name(self.id().rsplit(".", 1)[-1])
+        self.publisher = self.master.publish_shared_memory(self.name)
+        self.workers = []
+
+    def tearDown(self):
+        for worker in self.workers:
+            worker.stop_sharing()
+        self.master.stop_sharing()
+
+    def _worker(self, poll_interval=0):
+        worker = zirconium.ApplicationConfig(True)
+        worker.attach_shared_memory(self.name, poll_interval)
+        self.workers.append(worker)
+        return worker
+
+    def test_attach(self):
+        worker = self._worker()
+        changes = []
+        worker.on_change(("database", "port"), lambda old, new: changes.append((old, new)))
+        self.assertEqual(worker["database", "host"], "one")
+        self.assertEqual(worker.as_int(("database", "port")), 1)
+        self.assertEqual(worker.get("cache", "size"), 5)
+        first_segment = self.publisher._segment.name
+        self.master.set_defaults({"database": {"host": "one", "port": "2"}})
+        self.master.reload_config()
+        self.assertEqual(self.publisher.generation, 2)
+        self.assertEqual(worker.as_int(("database", "port")), 1)
+        worker.reload_config()
+        self.assertEqual(worker.as_int(("database", "port")), 2)
+        self.assertEqual(changes, [("1", "2")])
+        with self.assertRaises(FileNotFoundError):
+            SharedConfigReader(first_segment)
+        worker["database", "host"] = "local"
+        self.assertEqual(worker["database", "host"], "local")
+        self.assertEqual(worker["cache", "size"], 5)
+
+    def test_poll(self):
+        worker = self._worker(poll_interval=0.01)
+        self.master.set_defaults({"cache": {"size": 10}})
+        self.master.reload_config()
+        deadline = time.monotonic() + 5
+        while worker["cache", "size"] != 10 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(worker["cache", "size"], 10)
+
+    def test_other_process(self):
+        code = (
+            "import zirconium\n"
+            "config = zirconium.ApplicationConfig(True)\n"
+            f"config.attach_shared_memory({self.name!r}, 0)\n"
+            "print(config['database', 'host'])\n"
+        )
+        env = dict(os.environ, PYTHONPATH=str(Path(zirconium.__file__).parent.parent))
+        result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), "one")
+        self.assertNotIn("leaked", result.stderr)
+        # Still there once the other process exited
+        self.assertEqual(self._worker()["database", "host"], "one")
+
+    def test_publisher_restart(self):
+        worker = self._worker()
+        # A publisher that exited without removing the control segment
+        self.publisher.control.close()
+        self.publisher._segment.close()
+        old_segment = self.publisher._segment.name
+        other = SharedConfigPublisher(self.name)
+        try:
+            self.assertEqual(other.generation, 1)
+            with self.assertRaises(FileNotFoundError):
+                SharedConfigReader(old_segment)
+            self.assertFalse(worker.reload_config())
+            other.publish({"database": {"host": "two"}})
+            worker.reload_config()
+            self.assertEqual(worker["database", "host"], "two")
+        finally:
+            other.close()
+            self.master._shared_publisher = None
+
+    def test_bind(self):
+        worker = self._worker()
+        self.assertEqual(worker.bind(("database",), DatabaseSettings).value, DatabaseSettings("one", 1))
+        self.assertEqual(worker.as_dict("database").d, {"host": "one", "port": "1"})
+        self.assertEqual(worker["database"], {"host": "one", "port": "1"})
+        self.assertIsInstance(worker["database"], dict)
+
+    def test_access_report(self):
+        worker = self._worker()
+        worker.enable_access_stats()
+        worker["database", "host"]
+        self.assertEqual(worker.access_report()["never_read"], [("cache", "size"), ("database", "port")])
+
+    def test_long_name(self):
+        with self.assertRaises(ValueError):
+            SharedConfigPublisher("z" * 44)
+
+    def test_missing_segment(self):
+        reader = SharedConfigReader(self.name)
+        try:
+            self.publisher._write_control(self.publisher.generation + 1, b"zrtest-missing")
+            with self.assertRaises(FileNotFoundError):
+                reader.refresh()
+        finally:
+            reader.close()
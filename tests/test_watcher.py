@@ -0,0 +1,71 @@
+import unittest
+import tempfile
+import shutil
+import os
+import time
+from pathlib import Path
+
+import zirconium
+
+
+class TestConfigWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.config_file = self.directory / "config.json"
+        self.config_file.write_text('{"value": 1}')
+        self.config = zirconium.ApplicationConfig(True)
+        self.config.register_file(self.config_file)
+        self.config.init()
+
+    def tearDown(self):
+        self.config.stop_watching()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _wait_for(self, value, timeout=5):
+        end = time.monotonic() + timeout
+        while time.monotonic() < end:
+            if self.config.get("value") == value:
+                return True
+            time.sleep(0.02)
+        return False
+
+    def _replace(self, content):
+        temp_file = self.directory / ".config.json.tmp"
+        temp_file.write_text(content)
+        os.replace(temp_file, self.config_file)
+
+    def test_polling(self):
+        self.config.watch(debounce=0.05, poll_interval=0.05, use_inotify=False)
+        self.config_file.write_text('{"value": 22}')
+        self.assertTrue(self._wait_for(22))
+        self._replace('{"value": 3}')
+        self.assertTrue(self._wait_for(3))
+
+    def test_inotify(self):
+        # A long poll interval, so the change has to be noticed through inotify
+        watcher = self.config.watch(debounce=0.05, poll_interval=30)
+        if watcher._inotify is None:
+            self.skipTest("inotify is not available")
+        self._replace('{"value": 2}')
+        self.assertTrue(self._wait_for(2))
+
+    def test_symlink_swap(self):
+        # Kubernetes ConfigMap volumes point each file at ..data/<file>, and replace the ..data symlink on updates
+        first = self.directory / "..v1"
+        first.mkdir()
+        (first / "app.json").write_text('{"value": "v1"}')
+        second = self.directory / "..v2"
+        second.mkdir()
+        (second / "app.json").write_text('{"value": "v2"}')
+        os.symlink(first, self.directory / "..data")
+        os.symlink(self.directory / "..data" / "app.json", self.directory / "app.json")
+        config = zirconium.ApplicationConfig(True)
+        config.register_file(self.directory / "app.json")
+        config.init()
+        self.assertEqual(config["value"], "v1")
+        self.config = config
+        config.watch(debounce=0.05, poll_interval=0.05, use_inotify=False)
+        os.symlink(second, self.directory / "..data_tmp")
+        os.replace(self.directory / "..data_tmp", self.directory / "..data")
+        self.assertTrue(self._wait_for("v2"))